@@ -1,18 +1,55 @@
 # bot.py
-# python-telegram-bot v20+ (polling)
+# python-telegram-bot v20+ (polling yoki webhook)
 
 import os
+import re
+import base64
+import bisect
+import sys
+import glob
+import json
+import math
+import mmap
+import time
+import struct
+import signal
+import secrets
+import sqlite3
+import zlib
+import tempfile
+import threading
+import multiprocessing
+import heapq
+import queue
+import asyncio
 import logging
-from typing import Dict
+import functools
+import itertools
+from collections import OrderedDict
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
 from telegram.constants import ChatType
+from telegram.error import BadRequest, Forbidden, InvalidToken, RetryAfter, TelegramError
 from telegram.ext import (
     Application,
+    ApplicationHandlerStop,
+    BaseRateLimiter,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
     ContextTypes,
+    InlineQueryHandler,
+    TypeHandler,
     filters,
 )
 
@@ -26,6 +63,79 @@ ALLOWED_CHAT_ID = int(ALLOWED_CHAT_ID_RAW) if ALLOWED_CHAT_ID_RAW.lstrip("-").is
 # Deep-link ishlashi uchun bot username kerak bo'ladi (ixtiyoriy).
 BOT_USERNAME = (os.getenv("BOT_USERNAME") or "").strip()  # masalan: "Ali_Attar0_bot"
 
+# Webhook rejimi (ixtiyoriy): WEBHOOK_URL berilsa polling o'rniga webhook ishlaydi.
+WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").strip().rstrip("/")  # masalan: "https://bot.example.com"
+WEBHOOK_PATH = (os.getenv("WEBHOOK_PATH") or "telegram").strip().strip("/")
+# Telegram har bir so'rovda X-Telegram-Bot-Api-Secret-Token yuboradi, tekshiruv doim yoqiq:
+# berilmasa, har ishga tushishda tasodifiy secret yaratilib setWebhook bilan o'rnatiladi.
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET") or "").strip()
+WEBHOOK_SECRET_RE = re.compile(r"[A-Za-z0-9_-]{1,256}")  # Telegram talabi
+WEBHOOK_LISTEN = (os.getenv("WEBHOOK_LISTEN") or "0.0.0.0").strip()
+PORT_RAW = (os.getenv("PORT") or "").strip()
+PORT = int(PORT_RAW) if PORT_RAW.isdigit() else 8080
+
+# Parallel ishlov berish: turli chatlar bir vaqtda, bitta chat ichida esa navbat bilan.
+# 1 — eski (ketma-ket) xatti-harakat.
+CONCURRENT_UPDATES_RAW = (os.getenv("CONCURRENT_UPDATES") or "").strip()
+CONCURRENT_UPDATES = max(1, int(CONCURRENT_UPDATES_RAW)) if CONCURRENT_UPDATES_RAW.isdigit() else 1
+
+# FAQ kontenti alohida faylda (ixtiyoriy): `python bot.py pack faq.json faq.pack` bilan yig'iladi.
+# Berilmasa — quyidagi ichki FAQ ishlatiladi. Fayl o'zgarsa, bot uni to'xtamasdan qayta yuklaydi.
+CONTENT_PACK = (os.getenv("CONTENT_PACK") or "").strip()
+CONTENT_RELOAD_SECONDS = 5.0
+ANSWER_CACHE_SIZE = 256
+
+# Inline rejim (@bot matn): BotFather'da /setinline yoqilgan bo'lishi kerak
+INLINE_CACHE_TIME = 300
+INLINE_LRU_SIZE = 512
+INLINE_MAX_RESULTS = 10
+
+# Foydalanuvchi tili va oxirgi sahifasi shu faylda saqlanadi (restartdan keyin ham)
+STATE_DB = (os.getenv("STATE_DB") or "bot_state.sqlite3").strip()
+STATE_FLUSH_SECONDS = 2.0
+STATE_LRU_SIZE = 10_000
+# DM yetib bormagan (botni boshlamagan/bloklagan) foydalanuvchiga shuncha vaqt qayta urinilmaydi
+DM_BLOCKED_TTL_SECONDS = 3 * 24 * 3600
+
+# Mashhur savollar: so'nuvchi hisoblagichlar fayli, bosh menyuni yangilash oralig'i
+POPULARITY_FILE = (os.getenv("POPULARITY_FILE") or "faq_popularity.json").strip()
+POPULAR_HALF_LIFE_SECONDS = 3 * 24 * 3600
+POPULAR_REFRESH_SECONDS = 300.0
+POPULAR_TOP_N = 3  # bosh menyu tepasidagi tugmalar
+POPULAR_MIN_SCORE = 3.0  # shundan kam so'ralgan savol tepaga chiqmaydi
+POPULAR_WARM_N = 8  # javobi keshga oldindan tayyorlanadiganlar
+
+# Prometheus formatidagi /metrics (ixtiyoriy): METRICS_PORT berilsa ochiladi
+METRICS_PORT_RAW = (os.getenv("METRICS_PORT") or "").strip()
+METRICS_PORT = int(METRICS_PORT_RAW) if METRICS_PORT_RAW.isdigit() else None
+
+# Bir xil kontentni qayta edit qilmaslik va tez-tez bosishlarni birlashtirish
+EDIT_CACHE_SIZE = 5000
+TAP_DEBOUNCE_SECONDS = 0.7
+
+# Bot API manzili (ixtiyoriy): o'z telegram-bot-api serveri yoki loadtest.py soxta serveri
+BOT_API_URL = (os.getenv("BOT_API_URL") or "").strip().rstrip("/")
+
+# Ko'p jarayonli rejim: bitta qabul qiluvchi (polling/webhook) update'larni chat_id bo'yicha
+# N ta worker jarayoniga taqsimlaydi. 1 — hammasi bitta jarayonda (odatiy).
+BOT_WORKERS_RAW = (os.getenv("BOT_WORKERS") or "").strip()
+BOT_WORKERS = max(1, int(BOT_WORKERS_RAW)) if BOT_WORKERS_RAW.isdigit() else 1
+
+# Polling: SIGTERM'da ishlanayotgan update'lar shuncha soniya kutiladi, restartdan keyin
+# to'planib qolganlari esa BACKLOG_RATE update/s'dan oshmay qayta ishlanadi
+DRAIN_SECONDS_RAW = (os.getenv("DRAIN_SECONDS") or "").strip()
+DRAIN_SECONDS = float(DRAIN_SECONDS_RAW) if DRAIN_SECONDS_RAW.replace(".", "", 1).isdigit() else 8.0
+BACKLOG_RATE_RAW = (os.getenv("BACKLOG_RATE") or "").strip()
+BACKLOG_RATE = max(0.1, float(BACKLOG_RATE_RAW)) if BACKLOG_RATE_RAW.replace(".", "", 1).isdigit() else 10.0
+POLL_TIMEOUT = 30
+WORKER_POLL_SECONDS = 0.5  # worker navbatni shu oraliqda tekshiradi (SIGTERM uchun)
+
+# Guruhdagi xabarlar oqimi: qisqa oynada yig'iladi, bitta deleteMessages bilan o'chiriladi,
+# har bir foydalanuvchiga cooldown davomida ko'pi bilan bitta DM boradi
+BURST_WINDOW_SECONDS = 1.5
+DM_COOLDOWN_SECONDS = 60.0
+HINT_COOLDOWN_SECONDS = 300.0
+
 # Promo linklar
 TRANSPORT_LINK = "https://t.me/saudia0dan_group/199"
 ATTAR_LINK = "https://t.me/saudia0dan_group/20"
@@ -34,10 +144,18 @@ CONTACT_BOT = "@Ali_Attar0_bot"
 # ✅ Bot faqat shu topic ichida ishlaydi (siz xohlagan: 1)
 ONLY_TOPIC_ID = 1
 
+# Bir nechta guruh/topic (ixtiyoriy): JSON fayl, o'zgarsa restartsiz qayta o'qiladi.
+# {"allow_private": true, "routes": [{"chat_id": -100..., "thread_id": 1, "lang": "uz",
+#   "transport_link": "...", "attar_link": "...", "redirect": "dm"}]}
+ROUTES_FILE = (os.getenv("ROUTES_FILE") or "").strip()
+
 # ----------------- LOG -----------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+# Import paytida hech narsa sozlanmaydi — bot boshqa skriptdan yuklanganda ham (loadtest, webhook_once)
 log = logging.getLogger("umra_faq_bot")
 
+def setup_logging() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
 # ----------------- FAQ DATA (15 ta) -----------------
 FAQ: Dict[str, Dict[str, str]] = {
     "miqot": {
@@ -298,71 +416,502 @@ TOP_FAQ_KEYS = [
     "niyat",
 ]
 
+# Menyu bo'limlari: "items" ichida FAQ kaliti (TOP_FAQ_KEYS'dan) yoki ichki bo'lim bo'ladi.
+# Hech bir bo'limga kirmagan kalitlar bosh menyuning oxiriga qo'shiladi.
+FAQ_CATEGORIES = [
+    {
+        "title": {"uz": "🕋 Umra amallari", "kr": "🕋 Умра амаллари"},
+        "items": [
+            "miqot",
+            {
+                "title": {"uz": "🤍 Ehrom", "kr": "🤍 Эҳром"},
+                "items": ["ehrom_niyat", "ehrom_taqiq", "talbiya"],
+            },
+            "umra_tartibi",
+            "tavof_nima",
+            "sa_y",
+            "soch_qirqish",
+            "niyat",
+        ],
+    },
+    {
+        "title": {"uz": "🌴 Madina ziyorati", "kr": "🌴 Мадина зиёрати"},
+        "items": ["madina_3kun", "rawza", "uhud", "qubo"],
+    },
+    {
+        "title": {"uz": "💡 Amaliy maslahatlar", "kr": "💡 Амалий маслаҳатлар"},
+        "items": ["zamzam", "ramazon_umra"],
+    },
+]
+
 ITEMS_PER_PAGE = 8
-TOTAL_PAGES = 5
 
 PROMO_KEYS = {"miqot", "madina_3kun", "uhud", "qubo"}
 
+LANGS = ("uz", "kr")
+LANG_LABELS = {"uz": "UZB", "kr": "КРИЛ"}  # til tugmalari yozuvi
+
+# ----------------- CONTENT -----------------
+def first_line(text: str) -> str:
+    return text.strip().split("\n", 1)[0].strip()
+
+class BuiltinContent:
+    # Yuqoridagi FAQ lug'ati — CONTENT_PACK berilmaganda
+    source = "builtin"
+
+    def __init__(self, faq: Dict[str, Dict[str, str]], top: Iterable[str], promo: Iterable[str],
+                 categories: Iterable[Dict[str, Any]] = ()):
+        self._faq = faq
+        self.langs: Tuple[str, ...] = LANGS
+        self.top_keys: Tuple[str, ...] = tuple(top)
+        self.promo_keys = frozenset(promo)
+        self.categories: Tuple[Dict[str, Any], ...] = tuple(categories)
+        self._titles = {(k, lang): first_line(v[lang]) for k, v in faq.items() for lang in v}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._faq
+
+    def keys(self) -> Iterable[str]:
+        return self._faq.keys()
+
+    def text(self, key: str, lang: str) -> Optional[str]:
+        item = self._faq.get(key)
+        if item is None or lang not in item:
+            return None
+        return item[lang].strip()
+
+    def title(self, key: str, lang: str) -> str:
+        return self._titles[(key, lang)]
+
+# Pack formati: MAGIC | header uzunligi (u32, big-endian) | JSON header | matnlar (utf-8).
+# Header'da kalitlar ro'yxati, TOP/PROMO, bo'limlar, sarlavhalar va har bir matnning [offset, uzunlik] indeksi.
+PACK_MAGIC = b"UFAQPK1\n"
+
+class ContentPack:
+    # Fayl mmap qilinadi, matnlar faqat so'ralganda o'qiladi
+    def __init__(self, path: str):
+        self.source = path
+        with open(path, "rb") as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(PACK_MAGIC)] != PACK_MAGIC:
+            raise ValueError(f"{path}: content pack emas")
+        pos = len(PACK_MAGIC)
+        (header_len,) = struct.unpack_from(">I", self._mm, pos)
+        pos += 4
+        header = json.loads(self._mm[pos:pos + header_len].decode("utf-8"))
+        self._base = pos + header_len
+        self.langs = tuple(header["langs"])
+        self.top_keys = tuple(header["top"])
+        self.promo_keys = frozenset(header["promo"])
+        self.categories: Tuple[Dict[str, Any], ...] = tuple(header.get("categories") or ())
+        self._index: Dict[str, Dict[str, List[int]]] = header["index"]
+        self._titles: Dict[str, Dict[str, str]] = header["titles"]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def keys(self) -> Iterable[str]:
+        return self._index.keys()
+
+    def text(self, key: str, lang: str) -> Optional[str]:
+        entry = self._index.get(key)
+        if entry is None or lang not in entry:
+            return None
+        off, size = entry[lang]
+        start = self._base + off
+        return self._mm[start:start + size].decode("utf-8")
+
+    def title(self, key: str, lang: str) -> str:
+        return self._titles[key][lang]
+
+def check_categories(categories: Iterable[Dict[str, Any]], faq: Mapping[str, Any], langs: Iterable[str]) -> None:
+    for cat in categories:
+        missing_titles = [lang for lang in langs if lang not in cat.get("title", {})]
+        if missing_titles:
+            raise ValueError(f"bo'lim sarlavhasi yo'q ({missing_titles}): {cat.get('title')}")
+        missing = [k for k in cat["items"] if isinstance(k, str) and k not in faq]
+        if missing:
+            raise ValueError(f"bo'limda FAQ'da yo'q kalitlar: {missing}")
+        check_categories([c for c in cat["items"] if isinstance(c, dict)], faq, langs)
+
+def compile_content_pack(src_path: str, out_path: str) -> None:
+    # Manba JSON: {"langs": [...], "top": [...], "promo": [...], "categories": [...], "faq": {key: {lang: matn}}}
+    with open(src_path, encoding="utf-8") as f:
+        src = json.load(f)
+
+    langs = list(src.get("langs") or LANGS)
+    faq = src["faq"]
+    top = list(src.get("top") or faq.keys())
+    promo = [k for k in src.get("promo", []) if k in faq]
+    categories = list(src.get("categories") or [])
+    missing = [k for k in top if k not in faq]
+    if missing:
+        raise ValueError(f"top ro'yxatida FAQ'da yo'q kalitlar: {missing}")
+    check_categories(categories, faq, langs)
+
+    body = bytearray()
+    index: Dict[str, Dict[str, List[int]]] = {}
+    titles: Dict[str, Dict[str, str]] = {}
+    for key, item in faq.items():
+        for lang in langs:
+            if lang not in item:
+                raise ValueError(f"{key}: '{lang}' matni yo'q")
+            raw = item[lang].strip().encode("utf-8")
+            index.setdefault(key, {})[lang] = [len(body), len(raw)]
+            titles.setdefault(key, {})[lang] = first_line(item[lang])
+            body += raw
+
+    header = json.dumps(
+        {"langs": langs, "top": top, "promo": promo, "categories": categories, "index": index, "titles": titles},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+    # Avval vaqtinchalik faylga, keyin os.replace — bot hech qachon yarim yozilgan faylni ko'rmaydi
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PACK_MAGIC)
+        f.write(struct.pack(">I", len(header)))
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, out_path)
+
+def export_builtin_faq(out_path: str) -> None:
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "langs": list(LANGS), "top": TOP_FAQ_KEYS, "promo": sorted(PROMO_KEYS),
+                "categories": FAQ_CATEGORIES, "faq": FAQ,
+            },
+            f, ensure_ascii=False, indent=2,
+        )
+
+def load_content():
+    if CONTENT_PACK:
+        return ContentPack(CONTENT_PACK)
+    return BuiltinContent(FAQ, TOP_FAQ_KEYS, PROMO_KEYS, FAQ_CATEGORIES)
+
+CONTENT = load_content()
+
+# ----------------- MENU TREE -----------------
+# Bo'limlar daraxti ishga tushishda tekis ekranlar ro'yxatiga aylantiriladi: har bir
+# (bo'lim, sahifa) — bitta raqam. callback_data va user_state'dagi "page" shu raqam,
+# FAQ esa content ichidagi tartib raqami bilan yuriladi — tugma bosish O(1), callback_data
+# katalog qanchalik katta bo'lmasin bir necha baytdan oshmaydi.
+# Raqamlar joylashuvga bog'liq, shuning uchun daraxtning izi (stamp — tillar, kalitlar va
+# ekranlar tartibidan crc32) ham callback_data'ga yoziladi: pack yangilangach eski tugmalar
+# boshqa savolga tushmaydi, eskirgan deb topiladi.
+CALLBACK_DATA_LIMIT = 64  # Telegram cheklovi, bayt
+
+class MenuScreen:
+    __slots__ = ("index", "page", "pages", "parent", "title", "items")
+
+    def __init__(self, index: int, page: int, pages: int, parent: Optional[int],
+                 title: Optional[Mapping[str, str]], items: Tuple[Tuple[Optional[str], Optional[int]], ...]):
+        self.index = index
+        self.page = page
+        self.pages = pages
+        self.parent = parent  # ota bo'limning shu bo'lim turgan sahifasi
+        self.title = title
+        self.items = items  # (FAQ kaliti, None) yoki (None, ichki bo'lim ekrani)
+
+class MenuTree:
+    def __init__(self, content, per_page: int = ITEMS_PER_PAGE):
+        self.per_page = per_page
+        self.langs: Tuple[str, ...] = tuple(content.langs)
+        self.faq_keys: Tuple[str, ...] = tuple(content.keys())
+        self.faq_ids: Dict[str, int] = {k: i for i, k in enumerate(self.faq_keys)}
+        self.screens: List[MenuScreen] = []
+
+        placed = set()
+
+        def collect(items: Iterable[Any]) -> None:
+            for item in items:
+                if isinstance(item, str):
+                    placed.add(item)
+                else:
+                    collect(item["items"])
+
+        collect(content.categories)
+        rest = [k for k in content.top_keys if k not in placed]
+        self._add(None, [*content.categories, *rest], None)
+
+        layout = repr((self.langs, self.faq_keys, [(s.parent, s.items) for s in self.screens]))
+        self.stamp: bytes = struct.pack(">H", zlib.crc32(layout.encode("utf-8")) & 0xFFFF)
+
+    def _add(self, title: Optional[Mapping[str, str]], items: List[Any], parent: Optional[int]) -> int:
+        # Sahifalar soni ma'lumotdan: bo'sh sahifa hech qachon chiqmaydi
+        pages = max(1, math.ceil(len(items) / self.per_page))
+        first = len(self.screens)
+        self.screens.extend([None] * pages)  # type: ignore[list-item]
+        for page in range(pages):
+            entries = []
+            for item in items[page * self.per_page:(page + 1) * self.per_page]:
+                if isinstance(item, str):
+                    entries.append((item, None))
+                else:
+                    entries.append((None, self._add(item["title"], item["items"], first + page)))
+            self.screens[first + page] = MenuScreen(first + page, page, pages, parent, title, tuple(entries))
+        return first
+
+    def screen(self, index: int) -> MenuScreen:
+        return self.screens[index if 0 <= index < len(self.screens) else 0]
+
+    def faq_key(self, ref: Any) -> Optional[str]:
+        # Raqam — yangi tugmalar; kalit nomi — eski xabarlardagi tugmalar
+        if isinstance(ref, int):
+            return self.faq_keys[ref] if 0 <= ref < len(self.faq_keys) else None
+        if isinstance(ref, str) and ref.isdigit():
+            return self.faq_key(int(ref))
+        return ref if ref in self.faq_ids else None
+
+# ----------------- CALLBACK CODEC -----------------
+# callback_data = base64url(sarlavha | daraxt izi (2 bayt) | til | ekran varint | [FAQ raqami varint]).
+# Sarlavha baytining yuqori 4 biti — format versiyasi, pastki 4 biti — amal. Iz yoki versiya
+# mos kelmasa — tugma eskirgan (Callback.stale), raqamlari o'qilmaydi. Til — content
+# tillari (MenuTree.langs) ichidagi tartib raqami. Bo'lim va uning sahifasi bitta ekran
+# raqamida (MenuTree). ":" bilan yozilgan eski tugmalar ham o'qiladi.
+# Noto'g'ri payload istisno chiqarmaydi — decode_callback None qaytaradi; content'da yo'q
+# tilni kodlash esa ValueError (jimgina boshqa tilga aylanmasin).
+CALLBACK_VERSION = 2
+OP_PAGE, OP_LANG, OP_FAQ, OP_BACK = 1, 2, 3, 4
+CALLBACK_OPS = {OP_PAGE: "page", OP_LANG: "lang", OP_FAQ: "faq", OP_BACK: "back"}
+LEGACY_CALLBACK_OPS = {name: op for op, name in CALLBACK_OPS.items()}
+VARINT_MAX_BYTES = 4
+
+class Callback:
+    __slots__ = ("op", "lang", "page", "faq", "stale")
+
+    def __init__(self, op: int, lang: str, page: int, faq: Any = None, stale: bool = False):
+        self.op = op
+        self.lang = lang
+        self.page = page
+        self.faq = faq  # FAQ raqami (int) yoki eski tugmalarda kalit nomi (str)
+        self.stale = stale  # boshqa content/format bilan yaratilgan tugma
+
+def encode_callback(tree: MenuTree, op: int, lang: str, page: int, faq: Optional[int] = None) -> str:
+    if lang not in tree.langs:
+        raise ValueError(f"content'da bunday til yo'q: {lang!r}")
+    out = bytearray((CALLBACK_VERSION << 4 | op,))
+    out += tree.stamp
+    out.append(tree.langs.index(lang))
+    for value in (page,) if faq is None else (page, faq):
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+    return base64.urlsafe_b64encode(bytes(out)).rstrip(b"=").decode("ascii")
+
+def read_varint(raw: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    for shift in range(0, 7 * VARINT_MAX_BYTES, 7):
+        if pos >= len(raw):
+            break
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+    raise ValueError("varint buzilgan")
+
+def decode_legacy_callback(data: str) -> Optional[Callback]:
+    verb, _, rest = data.partition(":")
+    op = LEGACY_CALLBACK_OPS.get(verb)
+    if op == OP_PAGE:
+        page_s, lang = rest.split(":")
+    elif op == OP_FAQ:
+        ref, lang, page_s = rest.rsplit(":", 2)
+        return Callback(op, lang, int(page_s), ref)
+    elif op is not None:
+        lang, page_s = rest.split(":")
+    else:
+        return None
+    return Callback(op, lang, int(page_s))
+
+def decode_callback(data: str, tree: MenuTree) -> Optional[Callback]:
+    try:
+        if ":" in data:
+            return decode_legacy_callback(data)
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        if len(raw) < 3 or not 1 <= raw[0] >> 4 <= CALLBACK_VERSION or raw[0] & 0x0F not in CALLBACK_OPS:
+            return None
+        op = raw[0] & 0x0F
+        if raw[0] >> 4 != CALLBACK_VERSION or raw[1:3] != tree.stamp:
+            return Callback(op, tree.langs[0], 0, stale=True)
+        if len(raw) < 5 or raw[3] >= len(tree.langs):
+            return None
+        page, pos = read_varint(raw, 4)
+        faq = None
+        if op == OP_FAQ:
+            faq, pos = read_varint(raw, pos)
+        if pos != len(raw):
+            return None
+        return Callback(op, tree.langs[raw[3]], page, faq)
+    except ValueError:
+        # base64/int xatolari ham ValueError (binascii.Error) — buzilgan yoki begona payload
+        return None
+
+# ----------------- ROUTING -----------------
+# redirect: "dm" — o'chirib, shaxsiyga yozadi; "dm_keep" — o'chirmasdan shaxsiyga;
+# "delete" — faqat o'chiradi; "off" — tegmaydi.
+REDIRECT_MODES = ("dm", "dm_keep", "delete", "off")
+
+class Route:
+    __slots__ = ("chat_id", "thread_id", "lang", "links", "redirect")
+
+    def __init__(self, chat_id: Optional[int], thread_id: Optional[int], lang: str = "uz",
+                 transport_link: str = TRANSPORT_LINK, attar_link: str = ATTAR_LINK, redirect: str = "dm"):
+        if redirect not in REDIRECT_MODES:
+            raise ValueError(f"redirect noto'g'ri: {redirect!r}")
+        self.chat_id = chat_id
+        self.thread_id = thread_id
+        self.lang = lang
+        # Global linklar bilan bir xil bo'lsa None — umumiy javob keshidan foydalaniladi
+        links = (transport_link, attar_link)
+        self.links: Optional[Tuple[str, str]] = None if links == (TRANSPORT_LINK, ATTAR_LINK) else links
+        self.redirect = redirect
+
+class RouteTable:
+    # (chat_id, thread_id) -> Route; thread_id=None — guruhning barcha topiclari,
+    # chat_id=None — istalgan guruh (faqat cheklanmagan rejimda)
+    def __init__(self, routes: Iterable[Route], open_chats: bool, allow_private: bool, mtime: Optional[int] = None):
+        self.routes: Mapping[Tuple[Optional[int], Optional[int]], Route] = MappingProxyType(
+            {(r.chat_id, r.thread_id): r for r in routes}
+        )
+        self.chats = frozenset(chat for chat, _ in self.routes if chat is not None)
+        self.open_chats = open_chats
+        self.allow_private = allow_private
+        self.mtime = mtime
+
+    def allowed(self, chat_id: int) -> bool:
+        if self.open_chats or chat_id in self.chats:
+            return True
+        return self.allow_private and chat_id > 0
+
+    def lookup(self, chat_id: int, thread_id: Optional[int]) -> Optional[Route]:
+        routes = self.routes
+        return (
+            routes.get((chat_id, thread_id))
+            or routes.get((chat_id, None))
+            or routes.get((None, thread_id))
+        )
+
+def legacy_routes() -> RouteTable:
+    # ROUTES_FILE bo'lmasa — eski ALLOWED_CHAT_ID / ONLY_TOPIC_ID xatti-harakati
+    route = Route(ALLOWED_CHAT_ID, ONLY_TOPIC_ID)
+    return RouteTable([route], open_chats=ALLOWED_CHAT_ID is None, allow_private=False)
+
+def load_routes_file(path: str) -> RouteTable:
+    with open(path, encoding="utf-8") as f:
+        mtime = os.fstat(f.fileno()).st_mtime_ns
+        raw = json.load(f)
+    if isinstance(raw, list):
+        raw = {"routes": raw}
+
+    routes = []
+    for item in raw["routes"]:
+        routes.append(Route(
+            chat_id=int(item["chat_id"]),
+            thread_id=int(item["thread_id"]) if item.get("thread_id") is not None else None,
+            lang=item.get("lang", "uz"),
+            transport_link=item.get("transport_link", TRANSPORT_LINK),
+            attar_link=item.get("attar_link", ATTAR_LINK),
+            redirect=item.get("redirect", "dm"),
+        ))
+    return RouteTable(routes, open_chats=False, allow_private=bool(raw.get("allow_private", True)), mtime=mtime)
+
+ROUTES = load_routes_file(ROUTES_FILE) if ROUTES_FILE else legacy_routes()
+
+def reload_routes() -> bool:
+    global ROUTES
+    if not ROUTES_FILE:
+        return False
+    try:
+        if os.stat(ROUTES_FILE).st_mtime_ns == ROUTES.mtime:
+            return False
+        table = load_routes_file(ROUTES_FILE)
+    except Exception as e:
+        log.error("Routes fayli o'qilmadi (%s): %s", ROUTES_FILE, e)
+        return False
+    ROUTES = table
+    log.info("🔄 Routes yangilandi: %s ta", len(table.routes))
+    return True
+
 def chat_allowed(chat_id: int) -> bool:
-    if ALLOWED_CHAT_ID is None:
-        return True
-    return chat_id == ALLOWED_CHAT_ID
+    return ROUTES.allowed(chat_id)
 
 def title_of(key: str, lang: str) -> str:
-    txt = FAQ[key][lang].strip()
-    return txt.split("\n", 1)[0].strip()
+    return CONTENT.title(key, lang)
 
-def promo_block(lang: str) -> str:
+def promo_block(lang: str, links: Optional[Tuple[str, str]] = None) -> str:
+    transport_link, attar_link = links or (TRANSPORT_LINK, ATTAR_LINK)
     if lang == "kr":
         return (
             "\n\n—\n"
             "🚖 Зиёрат жойларига қулай бориш учун арзон такси топиб берамиз.\n"
-            f"🧭 Транспорт бўлими: {TRANSPORT_LINK}\n"
+            f"🧭 Транспорт бўлими: {transport_link}\n"
             "🌿 Ali Attar премиум аттарлари:\n"
-            f"{ATTAR_LINK}\n"
+            f"{attar_link}\n"
             f"Алоқа: {CONTACT_BOT}"
         )
     return (
         "\n\n—\n"
         "🚖 Ziyorat joylariga qulay borish uchun arzon taksi topib beramiz.\n"
-        f"🧭 Transport bo‘limi: {TRANSPORT_LINK}\n"
+        f"🧭 Transport bo‘limi: {transport_link}\n"
         "🌿 Ali Attar premium attarlari:\n"
-        f"{ATTAR_LINK}\n"
+        f"{attar_link}\n"
         f"Aloqa: {CONTACT_BOT}"
     )
 
-def build_faq_menu(page: int, lang: str) -> InlineKeyboardMarkup:
-    page = max(0, min(TOTAL_PAGES - 1, page))
-    start = page * ITEMS_PER_PAGE
-    end = start + ITEMS_PER_PAGE
-    keys = TOP_FAQ_KEYS[start:end]
+def callback_button(text: str, data: str) -> InlineKeyboardButton:
+    if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"callback_data {CALLBACK_DATA_LIMIT} baytdan uzun: {data}")
+    return InlineKeyboardButton(text, callback_data=data)
+
+def build_faq_menu(tree: MenuTree, page: int, lang: str, content=None, hot: Iterable[str] = ()) -> InlineKeyboardMarkup:
+    # hot — bosh sahifa tepasiga chiqariladigan mashhur savollar (POPULARITY)
+    content = content or CONTENT
+    screen = tree.screen(page)
+    page = screen.index
 
     rows = []
-    for k in keys:
-        rows.append([InlineKeyboardButton(title_of(k, lang), callback_data=f"faq:{k}:{lang}:{page}")])
+    for key in hot if page == 0 else ():
+        data = encode_callback(tree, OP_FAQ, lang, page, tree.faq_ids[key])
+        rows.append([callback_button(content.title(key, lang), data)])
+    for key, child in screen.items:
+        if key is not None:
+            data = encode_callback(tree, OP_FAQ, lang, page, tree.faq_ids[key])
+            rows.append([callback_button(content.title(key, lang), data)])
+        else:
+            title = tree.screens[child].title
+            data = encode_callback(tree, OP_PAGE, lang, child)
+            rows.append([callback_button(title.get(lang) or title[content.langs[0]], data)])
 
     nav = []
-    if page > 0:
-        nav.append(InlineKeyboardButton("⬅️", callback_data=f"page:{page-1}:{lang}"))
-    if page < TOTAL_PAGES - 1:
-        nav.append(InlineKeyboardButton("➡️", callback_data=f"page:{page+1}:{lang}"))
+    if screen.page > 0:
+        nav.append(callback_button("⬅️", encode_callback(tree, OP_PAGE, lang, page - 1)))
+    if screen.page < screen.pages - 1:
+        nav.append(callback_button("➡️", encode_callback(tree, OP_PAGE, lang, page + 1)))
     if nav:
         rows.append(nav)
+    if screen.parent is not None:
+        up = "⬆️ Бўлимлар" if lang == "kr" else "⬆️ Bo‘limlar"
+        rows.append([callback_button(up, encode_callback(tree, OP_PAGE, lang, screen.parent))])
 
     rows.append([
-        InlineKeyboardButton("UZB", callback_data=f"lang:uz:{page}"),
-        InlineKeyboardButton("КРИЛ", callback_data=f"lang:kr:{page}"),
+        callback_button(LANG_LABELS.get(code, code.upper()), encode_callback(tree, OP_LANG, code, page))
+        for code in tree.langs
     ])
 
     return InlineKeyboardMarkup(rows)
 
-def build_answer_kb(lang: str, page: int) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Orqaga", callback_data=f"back:{lang}:{page}")]])
+def build_answer_kb(tree: MenuTree, lang: str, page: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[callback_button("⬅️ Orqaga", encode_callback(tree, OP_BACK, lang, page))]])
 
 def start_text(lang: str) -> str:
     if lang == "kr":
         if BOT_USERNAME:
-            deep = f"https://t.me/{BOT_USERNAME}?start=faq_madina_3kun"
+            deep = f"https://t.me/{BOT_USERNAME}?start=faq_kr_madina_3kun"
             example_line = f"• “Мадинага келдим, 3 кунда қаерларга борай?” ({deep})"
         else:
             example_line = "• “Мадинага келдим, 3 кунда қаерларга борай?”"
@@ -387,19 +936,1365 @@ def start_text(lang: str) -> str:
             f"{example_line}"
         )
 
+# ----------------- MATCHER -----------------
+# Guruhdagi erkin savolni FAQ kalitiga moslash: lotin/kirill bitta yozuvga keltiriladi,
+# so'zlar 3-gramlarga bo'linadi va oldindan hisoblangan BM25 og'irliklari qo'shiladi.
+CYR_TO_LAT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "қ": "q", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ў": "o",
+    "ф": "f", "х": "x", "ҳ": "h", "ц": "s", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "",
+    "ь": "", "ы": "i", "э": "e", "ю": "yu", "я": "ya", "w": "v",
+    # o‘, g‘, sa’y — tutuq belgilari tashlab yuboriladi
+    "‘": "", "’": "", "ʻ": "", "ʼ": "", "'": "", "`": "",
+})
+WORD_RE = re.compile(r"[a-z0-9]+")
+CYR_RE = re.compile(r"[\u0400-\u04ff]")
+# So'roq so'zlari va salomlashish hech qaysi savolni ajratib bermaydi
+STOP_WORDS = frozenset({
+    "nima", "nimalar", "qanday", "qanaqa", "qayer", "qayerga", "qayerda", "qaerga", "qaerda",
+    "qachon", "kerak", "mumkin", "bolad", "boladimi", "qilinadi", "qilish", "haqida", "uchun",
+    "salom", "assalomu", "alaykum", "rahmat", "iltimos", "yordam", "bering", "ham", "bilan",
+})
+
+# match_corpus.jsonl bo'yicha tanlangan: noto'g'ri DM javobsiz qolgandan yomonroq, shuning uchun
+# begona xabarlar (eng yuqorisi ~14.2) javobsiz qoladi, qisqa savollarning bir qismi ham
+# (loadtest.py match --min-precision)
+MATCH_MIN_SCORE = 16.0
+MATCH_MIN_MARGIN = 1.2  # 1-o'rin 2-o'rindan kamida shuncha marta yuqori bo'lsin
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def normalize_text(text: str) -> str:
+    return text.lower().translate(CYR_TO_LAT)
+
+def text_lang(text: str) -> str:
+    return "kr" if CYR_RE.search(text) else "uz"
+
+def text_terms(text: str) -> List[str]:
+    terms = []
+    for word in WORD_RE.findall(normalize_text(text)):
+        if len(word) < 3 or word in STOP_WORDS:
+            continue
+        padded = f"^{word}$"
+        terms.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return terms
+
+class FaqMatcher:
+    __slots__ = ("keys", "index")
+
+    def __init__(self, content):
+        self.keys: Tuple[str, ...] = tuple(content.keys())
+        docs: List[Dict[str, int]] = []
+        for key in self.keys:
+            tf: Dict[str, int] = {}
+            for lang in content.langs:
+                body = content.text(key, lang) or ""
+                # Sarlavha ikki marta — sarlavhadagi so'zlar muhimroq
+                for term in text_terms(f"{content.title(key, lang)} {body}"):
+                    tf[term] = tf.get(term, 0) + 1
+            docs.append(tf)
+
+        n = len(docs)
+        lengths = [sum(tf.values()) for tf in docs]
+        avgdl = (sum(lengths) / n) if n else 1.0
+        df: Dict[str, int] = {}
+        for tf in docs:
+            for term in tf:
+                df[term] = df.get(term, 0) + 1
+
+        # term -> [(hujjat raqami, tayyor BM25 og'irligi)]
+        index: Dict[str, Tuple[Tuple[int, float], ...]] = {}
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc_id, tf in enumerate(docs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avgdl)
+            for term, freq in tf.items():
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                postings.setdefault(term, []).append((doc_id, idf * freq * (BM25_K1 + 1) / (freq + norm)))
+        for term, items in postings.items():
+            index[term] = tuple(items)
+        self.index: Mapping[str, Tuple[Tuple[int, float], ...]] = MappingProxyType(index)
+
+    def scores(self, text: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        seen: Set[str] = set()
+        for term in text_terms(text):
+            if term in seen:
+                continue
+            seen.add(term)
+            for doc_id, weight in self.index.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        return scores
+
+    def match(self, text: str) -> Optional[str]:
+        scores = self.scores(text)
+        if not scores:
+            return None
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        best_id, best = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        if best < MATCH_MIN_SCORE or best < second * MATCH_MIN_MARGIN:
+            return None
+        return self.keys[best_id]
+
+# Indeks birinchi guruh xabarida quriladi — sovuq start'da kerak emas
+MATCHER: Optional[FaqMatcher] = None
+
+def get_matcher() -> FaqMatcher:
+    global MATCHER
+    if MATCHER is None:
+        MATCHER = FaqMatcher(CONTENT)
+    return MATCHER
+
+# ----------------- INLINE INDEX -----------------
+# Sarlavha va matn so'zlari saralangan ro'yxatda: so'rovdagi har bir so'z prefiks sifatida
+# bisect bilan qidiriladi. Mashhur so'rovlar natijasi LRU'da turadi — kontent qayta skanerlanmaydi.
+TITLE_WEIGHT = 3
+
+class InlineIndex:
+    __slots__ = ("content", "words", "postings", "_lru")
+
+    def __init__(self, content):
+        self.content = content
+        postings: Dict[str, Dict[str, int]] = {}
+        for key in content.keys():
+            for lang in content.langs:
+                title = content.title(key, lang)
+                body = content.text(key, lang) or ""
+                for weight, text in ((TITLE_WEIGHT, title), (1, body)):
+                    for word in WORD_RE.findall(normalize_text(text)):
+                        if word in STOP_WORDS:
+                            continue
+                        per_key = postings.setdefault(word, {})
+                        per_key[key] = max(per_key.get(key, 0), weight)
+
+        self.words: Tuple[str, ...] = tuple(sorted(postings))
+        self.postings: Mapping[str, Tuple[Tuple[str, int], ...]] = MappingProxyType(
+            {w: tuple(keys.items()) for w, keys in postings.items()}
+        )
+        self._lru: "OrderedDict[Tuple[str, str], Tuple[str, ...]]" = OrderedDict()
+
+    def _prefix_keys(self, prefix: str) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        i = bisect.bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            for key, weight in self.postings[self.words[i]]:
+                if weight > found.get(key, 0):
+                    found[key] = weight
+            i += 1
+        return found
+
+    def search(self, query: str) -> Tuple[str, ...]:
+        words = [w for w in WORD_RE.findall(normalize_text(query)) if w not in STOP_WORDS]
+        if not words:
+            return self.content.top_keys[:INLINE_MAX_RESULTS]
+
+        # Har bir so'z topilishi shart; ball — so'zlar og'irligi yig'indisi
+        scores: Optional[Dict[str, int]] = None
+        for word in words:
+            found = self._prefix_keys(word)
+            if scores is None:
+                scores = found
+            else:
+                scores = {k: v + found[k] for k, v in scores.items() if k in found}
+            if not scores:
+                return ()
+
+        order = {k: i for i, k in enumerate(self.content.top_keys)}
+        ranked = sorted(scores, key=lambda k: (-scores[k], order.get(k, len(order))))
+        return tuple(ranked[:INLINE_MAX_RESULTS])
+
+    def lookup(self, query: str, lang: str) -> Tuple[str, ...]:
+        cache_key = (" ".join(WORD_RE.findall(normalize_text(query))), lang)
+        keys = self._lru.get(cache_key)
+        if keys is not None:
+            self._lru.move_to_end(cache_key)
+            return keys
+        keys = self.search(query)
+        self._lru[cache_key] = keys
+        if len(self._lru) > INLINE_LRU_SIZE:
+            self._lru.popitem(last=False)
+        return keys
+
+INLINE: Optional[InlineIndex] = None
+
+def get_inline() -> InlineIndex:
+    global INLINE
+    if INLINE is None:
+        INLINE = InlineIndex(CONTENT)
+    return INLINE
+
+# ----------------- RENDER CACHE -----------------
+# Har bir tugma bosilganda menyu/javobni qayta qurmaslik uchun hammasi
+# ishga tushishda bir marta tayyorlanadi va o'zgarmas jadvalda saqlanadi.
+# Pack'dan o'qilganda javob matnlari birinchi so'rovda tayyorlanadi (chegaralangan).
+class RenderCache:
+    __slots__ = (
+        "content", "tree", "default_lang", "hot", "_menus", "menus", "_answers", "_articles", "answer_kbs",
+        "start_texts", "deep_links",
+    )
+
+    def __init__(self, content):
+        self.content = content
+        self.tree = MenuTree(content)
+        self.default_lang = content.langs[0]
+        menus = {}
+        answer_kbs = {}
+        for lang in content.langs:
+            for page in range(len(self.tree.screens)):
+                menus[(page, lang)] = build_faq_menu(self.tree, page, lang, content)
+                answer_kbs[(lang, page)] = build_answer_kb(self.tree, lang, page)
+
+        self._answers: Dict[Tuple[str, str, Optional[Tuple[str, str]]], str] = {}
+        self._articles: Dict[Tuple[str, str], InlineQueryResultArticle] = {}
+        if isinstance(content, BuiltinContent):
+            for key in content.keys():
+                for lang in content.langs:
+                    self.answer(key, lang)
+
+        # Bosh sahifa (0) mashhur savollar o'zgarganda set_hot orqali almashtiriladi
+        self.hot: Dict[str, Tuple[str, ...]] = {}
+        self._menus = menus
+        self.menus: Mapping[Tuple[int, str], InlineKeyboardMarkup] = MappingProxyType(menus)
+        self.answer_kbs: Mapping[Tuple[str, int], InlineKeyboardMarkup] = MappingProxyType(answer_kbs)
+        self.start_texts: Mapping[str, str] = MappingProxyType({lang: start_text(lang) for lang in content.langs})
+
+        # /start payload -> (kalit, til). faq_<key> — foydalanuvchi tanlagan tilda,
+        # faq_<til>_<key> (masalan faq_kr_rawza) — aynan shu tilda.
+        deep_links: Dict[str, Tuple[str, Optional[str]]] = {f"faq_{key}": (key, None) for key in self.tree.faq_keys}
+        for lang in content.langs:
+            for key in self.tree.faq_keys:
+                deep_links.setdefault(f"faq_{lang}_{key}", (key, lang))
+        self.deep_links: Mapping[str, Tuple[str, Optional[str]]] = MappingProxyType(deep_links)
+
+    def lang(self, lang: str) -> str:
+        return lang if lang in self.start_texts else self.default_lang
+
+    def menu(self, page: int, lang: str) -> InlineKeyboardMarkup:
+        return self.menus[(self.tree.screen(page).index, self.lang(lang))]
+
+    def answer_kb(self, lang: str, page: int) -> InlineKeyboardMarkup:
+        return self.answer_kbs[(self.lang(lang), self.tree.screen(page).index)]
+
+    def set_hot(self, lang: str, keys: Iterable[str]) -> bool:
+        keys = tuple(k for k in keys if k in self.tree.faq_ids)
+        if lang not in self.start_texts or self.hot.get(lang, ()) == keys:
+            return False
+        self.hot[lang] = keys
+        self._menus[(0, lang)] = build_faq_menu(self.tree, 0, lang, self.content, keys)
+        return True
+
+    def warm(self, keys: Iterable[str], lang: str) -> None:
+        # Keshning oxiriga o'tkaziladi — chegaraga yetganda birinchi bo'lib chiqarilmaydi
+        for key in keys:
+            cached = self._answers.pop((key, lang, None), None)
+            if cached is not None:
+                self._answers[(key, lang, None)] = cached
+            else:
+                self.answer(key, lang)
+
+    def answer(self, key: str, lang: str, links: Optional[Tuple[str, str]] = None) -> Optional[str]:
+        # links — route'ning o'z promo linklari (None — global TRANSPORT_LINK/ATTAR_LINK)
+        cache_key = (key, lang, links)
+        cached = self._answers.get(cache_key)
+        if cached is not None:
+            return cached
+        text = self.content.text(key, lang)
+        if text is None:
+            return None
+        if key in self.content.promo_keys:
+            text += promo_block(lang, links)
+        if len(self._answers) >= ANSWER_CACHE_SIZE and not isinstance(self.content, BuiltinContent):
+            self._answers.pop(next(iter(self._answers)))
+        self._answers[cache_key] = text
+        return text
+
+    def article(self, key: str, lang: str) -> Optional[InlineQueryResultArticle]:
+        art = self._articles.get((key, lang))
+        if art is not None:
+            return art
+        text = self.answer(key, lang)
+        if text is None:
+            return None
+        body = text.split("\n\n", 1)[-1].strip().split("\n", 1)[0]
+        art = InlineQueryResultArticle(
+            id=f"{key}:{lang}",
+            title=self.content.title(key, lang),
+            description=body[:100],
+            input_message_content=InputTextMessageContent(text, disable_web_page_preview=True),
+        )
+        self._articles[(key, lang)] = art
+        return art
+
+    def start(self, lang: str) -> str:
+        return self.start_texts[self.lang(lang)]
+
+RENDER = RenderCache(CONTENT)
+
+def reload_content() -> bool:
+    # Yangi pack to'liq tayyor bo'lgandan keyingina global havolalar almashtiriladi
+    global CONTENT, RENDER, MATCHER, INLINE
+    if not CONTENT_PACK:
+        return False
+    try:
+        mtime = os.stat(CONTENT_PACK).st_mtime_ns
+    except OSError:
+        return False
+    if mtime == getattr(CONTENT, "mtime", None):
+        return False
+
+    try:
+        content = ContentPack(CONTENT_PACK)
+        render = RenderCache(content)
+    except Exception as e:
+        log.error("Content pack yuklanmadi (%s): %s", CONTENT_PACK, e)
+        return False
+
+    # Matcher va inline indeks yangi content'dan kerak bo'lganda qayta quriladi
+    CONTENT, RENDER, MATCHER, INLINE = content, render, None, None
+    POPULARITY.apply(render)
+    log.info("🔄 Content pack yangilandi: %s | %s ta savol", CONTENT_PACK, len(content.top_keys))
+    return True
+
+async def watch_files() -> None:
+    # CONTENT_PACK va ROUTES_FILE o'zgarishini kuzatadi
+    while True:
+        await asyncio.sleep(CONTENT_RELOAD_SECONDS)
+        reload_content()
+        reload_routes()
+
+# ----------------- CONCURRENCY -----------------
+def update_chat_key(update: object) -> Optional[int]:
+    if not isinstance(update, Update):
+        return None
+    chat = update.effective_chat
+    msg = update.message
+    if (
+        chat and chat.type in (ChatType.GROUP, ChatType.SUPERGROUP) and update.effective_user
+        and msg is not None and msg.text and not msg.text.startswith("/")
+    ):
+        # Guruhdagi oddiy matnlar foydalanuvchi bo'yicha navbatga qo'yiladi: javob baribir uning
+        # shaxsiy chatiga boradi (private chat id == user id), boshqalar kutib qolmaydi.
+        # Tugma bosishlar esa chat bo'yicha — bitta guruh menyusidagi edit'lar tartibi saqlanadi.
+        return update.effective_user.id
+    if chat:
+        return chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    # Turli chatlarning update'lari parallel ishlaydi (max_concurrent_updates gacha),
+    # bitta chatnikilar esa kelgan tartibida: page: va faq: edit'lari aralashib ketmaydi.
+    # Umumiy slot chat navbati kelgandan keyin olinadi — bitta chatda kutib turgan
+    # update'lar boshqa chatlarning slotini band qilmaydi.
+    __slots__ = ("_locks", "_waiting")
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        key = update_chat_key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            left = self._waiting[key] - 1
+            if left:
+                self._waiting[key] = left
+            else:
+                # Chat bo'yicha navbat bo'sh — lug'at cheksiz o'sib ketmasin
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+# ----------------- METRICS -----------------
+# Yozish arzon (bisect + qo'shish), matnga aylantirish faqat /metrics so'ralganda.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Metrics:
+    def __init__(self):
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        # Boshqa obyektlardagi tayyor hisoblagichlar (masalan, OUTBOUND.stats)
+        self.collectors: List[Callable[[], Iterable[Tuple[str, Labels, float]]]] = []
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        series = self.histograms.setdefault(name, {})
+        hist = series.get(labels)
+        if hist is None:
+            hist = series[labels] = Histogram()
+        hist.observe(value)
+
+    def inc(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def error(self, where: str) -> None:
+        # Jimgina yutib yuborilgan xatolar shu yerda sanaladi
+        self.inc("umra_bot_swallowed_errors_total", (("where", where),))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series.items():
+                running = 0
+                for bound, n in zip(LATENCY_BUCKETS, hist.counts):
+                    running += n
+                    le = format_labels(labels + (("le", str(bound)),))
+                    lines.append(f"{name}_bucket{le} {running}")
+                le = format_labels(labels + (("le", "+Inf"),))
+                lines.append(f"{name}_bucket{le} {hist.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {hist.total}")
+                lines.append(f"{name}_count{format_labels(labels)} {hist.count}")
+
+        counters: Dict[str, Dict[Labels, float]] = {n: dict(v) for n, v in self.counters.items()}
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                counters.setdefault(name, {})[labels] = value
+        for name, series in counters.items():
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+# Joriy handler ichidagi Telegram API kutish vaqti (OutboundLimiter to'ldiradi)
+API_WAIT: ContextVar[Optional[List[float]]] = ContextVar("api_wait", default=None)
+
+def instrumented(handler: str, action: Optional[Callable[[Update], str]] = None):
+    # Handler vaqtini ikkiga bo'lib yozadi: lokal ishlov va Telegram API kutish.
+    # Boshqa handler ichidan chaqirilsa (deep_start_cmd -> start_cmd) alohida yozilmaydi —
+    # vaqt va API kutish tashqi handlerga tushadi, so'rov bir marta sanaladi.
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            if API_WAIT.get() is not None:
+                return await fn(update, context)
+            acc = [0.0]
+            token = API_WAIT.set(acc)
+            start = time.perf_counter()
+            try:
+                return await fn(update, context)
+            except Exception:
+                METRICS.inc("umra_bot_handler_errors_total", (("handler", handler),))
+                raise
+            finally:
+                total = time.perf_counter() - start
+                API_WAIT.reset(token)
+                act = action(update) if action else ""
+                METRICS.observe("umra_bot_handler_seconds", (("handler", handler), ("action", act), ("part", "local")), total - acc[0])
+                METRICS.observe("umra_bot_handler_seconds", (("handler", handler), ("action", act), ("part", "api")), acc[0])
+        return wrapper
+    return decorator
+
+def callback_action(update: Update) -> str:
+    data = update.callback_query.data if update.callback_query else None
+    cb = decode_callback(data or "", RENDER.tree)
+    if cb is None:
+        return "other"
+    return "stale" if cb.stale else CALLBACK_OPS[cb.op]
+
+def deep_start_action(update: Update) -> str:
+    # /start faq_<key> — javob, qolgani — menyu
+    args = (update.message.text or "").split()[1:] if update.message else []
+    return "faq" if args and args[0].strip() in RENDER.deep_links else "menu"
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+        if path.split(b"?", 1)[0] == b"/metrics":
+            body = METRICS.render().encode("utf-8")
+            head = b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+        else:
+            body = b"not found\n"
+            head = b"HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+        writer.write(head + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+# ----------------- OUTBOUND LIMITER -----------------
+# Telegram limitlari: umumiy ~30 xabar/s, bitta guruhga ~20 xabar/daqiqa.
+GLOBAL_RATE = (30, 1.0)
+GROUP_RATE = (20, 60.0)
+MAX_RETRIES = 3
+
+# Kichik raqam — oldinroq yuboriladi: tugma bosishga edit, foydalanuvchiga javob, keyin ommaviy DM'lar
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+INTERACTIVE_ENDPOINTS = frozenset({
+    "answerCallbackQuery",
+    "answerInlineQuery",
+    "editMessageText",
+    "editMessageReplyMarkup",
+})
+# Umumiy limitga xabar yuborish va edit'lar kiradi, guruh limitiga — faqat yuborish.
+# Callback/inline javoblari, o'chirish va getUpdates navbatsiz o'tadi (ular uchun ham
+# RetryAfter qayta urinish ishlaydi) — bitta tugma bosish bitta token oladi.
+SEND_ENDPOINTS = frozenset({"sendMessage", "sendPhoto", "sendDocument", "copyMessage", "forwardMessage"})
+EDIT_ENDPOINTS = frozenset({"editMessageText", "editMessageReplyMarkup"})
+
+class TokenBucket:
+    __slots__ = ("capacity", "fill_rate", "tokens", "stamp", "paused_until")
+
+    def __init__(self, rate: float, per: float, full: bool = True):
+        self.capacity = float(rate)
+        self.fill_rate = rate / per
+        self.tokens = float(rate) if full else 0.0
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.fill_rate)
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        # Keyingi token tayyor bo'lguncha qancha kutish kerak (0 — hozir)
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.fill_rate
+        return max(wait, self.paused_until - now)
+
+    def reserve(self) -> float:
+        # Tokenni oldindan band qiladi (balans manfiy bo'lishi mumkin) — FIFO navbat
+        now = time.monotonic()
+        wait = self.delay(now)
+        self.tokens -= 1
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class OutboundLimiter(BaseRateLimiter[int]):
+    # Barcha API so'rovlari shu yerdan o'tadi: xabar yuborish va edit'lar umumiy limit uchun
+    # ustuvorlikli navbatdan o'tadi (tugma edit'lari, keyin javoblar, keyin guruhdan yo'naltirilgan
+    # DM'lar), guruh limiti uchun alohida bucket'lar, RetryAfter bo'lsa kutib qayta urinish.
+    def __init__(self, max_retries: int = MAX_RETRIES, global_rate: Tuple[float, float] = GLOBAL_RATE,
+                 burst: bool = True):
+        self.max_retries = max_retries
+        # burst=False — bucket bo'sh boshlanadi (restartdan keyin boshlang'ich portlash yo'q)
+        self._global = TokenBucket(*global_rate, full=burst)
+        self._groups: Dict[int, TokenBucket] = {}
+        self._heap: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self.stats: Dict[str, int] = {"queued": 0, "sent": 0, "retried": 0, "dropped": 0, "failed": 0}
+
+    async def initialize(self) -> None:
+        self._cond = asyncio.Condition()
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _group_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._groups.get(chat_id)
+        if bucket is None:
+            bucket = self._groups[chat_id] = TokenBucket(*GROUP_RATE)
+        return bucket
+
+    async def _acquire_global(self, priority: int) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        entry = (priority, next(self._seq))
+        async with self._cond:
+            heapq.heappush(self._heap, entry)
+            self._cond.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if self._heap[0] == entry:
+                        timeout = self._global.delay(time.monotonic())
+                        if timeout <= 0:
+                            heapq.heappop(self._heap)
+                            self._global.tokens -= 1
+                            self._cond.notify_all()
+                            return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._heap:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+                    self._cond.notify_all()
+                raise
+
+    async def process_request(
+        self,
+        callback: Callable[..., Any],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        if rate_limit_args is not None:
+            priority = rate_limit_args
+        elif endpoint in INTERACTIVE_ENDPOINTS:
+            priority = PRIORITY_INTERACTIVE
+        else:
+            priority = PRIORITY_NORMAL
+
+        sending = endpoint in SEND_ENDPOINTS
+        limited = sending or endpoint in EDIT_ENDPOINTS
+        chat_id = data.get("chat_id")
+        group = None
+        if sending and isinstance(chat_id, int) and chat_id < 0:
+            group = self._group_bucket(chat_id)
+
+        self.stats["queued"] += 1
+        acc = API_WAIT.get()
+        started = time.perf_counter()
+        try:
+            return await self._send(callback, args, kwargs, endpoint, chat_id, limited, group, priority)
+        finally:
+            if acc is not None:
+                acc[0] += time.perf_counter() - started
+
+    async def _send(self, callback, args, kwargs, endpoint: str, chat_id: Any, limited: bool,
+                    group: Optional[TokenBucket], priority: int) -> Any:
+        attempt = 0
+        while True:
+            if group is not None:
+                wait = group.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            if limited:
+                await self._acquire_global(priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt >= self.max_retries:
+                    self.stats["dropped"] += 1
+                    raise
+                attempt += 1
+                self.stats["retried"] += 1
+                retry_after = float(exc.retry_after)
+                if limited:
+                    (group or self._global).pause(retry_after)
+                log.warning("RetryAfter %.1fs | %s | chat: %s | urinish: %s", retry_after, endpoint, chat_id, attempt)
+                await asyncio.sleep(retry_after)
+                continue
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+            self.stats["sent"] += 1
+            return result
+
+OUTBOUND = OutboundLimiter()
+METRICS.collectors.append(
+    lambda: [("umra_bot_outbound_total", (("event", k),), v) for k, v in OUTBOUND.stats.items()]
+)
+
+# ----------------- USER STATE -----------------
+# Til va sahifa xotiradagi LRU'da turadi, o'zgarishlar esa fon vazifasi orqali
+# partiyalab SQLite'ga yoziladi (write-behind). Shu bazada DM yuborib bo'lmaydigan
+# foydalanuvchilar ro'yxati (TTL bilan) va polling offset'i ham saqlanadi.
+class UserStateStore:
+    DEFAULT = ("uz", 0)
+
+    def __init__(self, path: str, lru_size: int = STATE_LRU_SIZE, shared: bool = False):
+        self.path = path
+        self.lru_size = lru_size
+        # shared — bazani bir nechta jarayon (BOT_WORKERS) birga yozadi, xotiradagi nusxaga ishonib bo'lmaydi
+        self.shared = shared
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._lru: "OrderedDict[int, Optional[Tuple[str, int]]]" = OrderedDict()
+        self._dirty: Dict[int, Tuple[str, int]] = {}
+        # user_id -> muddati (unix vaqt); bazadan birinchi so'rovda bir marta o'qiladi
+        self._blocked: Optional[Dict[int, float]] = None
+        self._blocked_dirty: Dict[int, Optional[float]] = {}
+        self.blocked_stats: Dict[str, int] = {"hits": 0, "misses": 0, "added": 0, "cleared": 0}
+        self._offset_dirty: Optional[int] = None
+        # update_id -> JSON (qo'shish) yoki None (tugadi, o'chirish)
+        self._pending_dirty: Dict[int, Optional[str]] = {}
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS user_state ("
+                "user_id INTEGER PRIMARY KEY, lang TEXT NOT NULL, page INTEGER NOT NULL)"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS dm_blocked (user_id INTEGER PRIMARY KEY, until REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS bot_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS pending_updates (update_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _remember(self, user_id: int, state: Optional[Tuple[str, int]]) -> None:
+        if self.shared:
+            # Til/sahifani boshqa worker o'zgartirishi mumkin — har safar bazadan o'qiladi
+            return
+        self._lru[user_id] = state
+        self._lru.move_to_end(user_id)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, user_id: int, default: Tuple[str, int] = DEFAULT) -> Tuple[str, int]:
+        # LRU'da None — bazada yo'qligi ma'lum (qayta so'ralmaydi)
+        if user_id in self._lru:
+            self._lru.move_to_end(user_id)
+            return self._lru[user_id] or default
+        state = self._dirty.get(user_id)
+        if state is None:
+            with self._db_lock:
+                row = self.db.execute("SELECT lang, page FROM user_state WHERE user_id = ?", (user_id,)).fetchone()
+            state = (row[0], row[1]) if row else None
+        self._remember(user_id, state)
+        return state or default
+
+    def set(self, user_id: int, lang: str, page: int) -> None:
+        state = (lang, page)
+        if self._lru.get(user_id) == state:
+            return
+        self._remember(user_id, state)
+        self._dirty[user_id] = state
+
+    def _blocked_map(self) -> Dict[int, float]:
+        if self._blocked is None:
+            with self._db_lock:
+                rows = self.db.execute("SELECT user_id, until FROM dm_blocked WHERE until > ?", (time.time(),)).fetchall()
+            self._blocked = dict(rows)
+        return self._blocked
+
+    def dm_blocked(self, user_id: int) -> bool:
+        blocked = self._blocked_map()
+        until = blocked.get(user_id)
+        if until is not None and until <= time.time():
+            # Muddati o'tdi — yana urinib ko'ramiz
+            del blocked[user_id]
+            self._blocked_dirty[user_id] = None
+            until = None
+        if until is not None and self.shared and user_id not in self._blocked_dirty and not self._blocked_in_db(user_id):
+            # /start boshqa worker'ga tushib, yozuvni bazadan o'chirgan
+            del blocked[user_id]
+            until = None
+        if until is None:
+            self.blocked_stats["misses"] += 1
+            return False
+        self.blocked_stats["hits"] += 1
+        return True
+
+    def _blocked_in_db(self, user_id: int) -> bool:
+        with self._db_lock:
+            row = self.db.execute("SELECT 1 FROM dm_blocked WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None
+
+    def block_dm(self, user_id: int, ttl: float = DM_BLOCKED_TTL_SECONDS) -> None:
+        until = time.time() + ttl
+        self._blocked_map()[user_id] = until
+        self._blocked_dirty[user_id] = until
+        self.blocked_stats["added"] += 1
+
+    def unblock_dm(self, user_id: int) -> None:
+        # DELETE har doim yoziladi: yozuv boshqa worker xaritasida bo'lishi mumkin
+        if self._blocked_map().pop(user_id, None) is not None:
+            self.blocked_stats["cleared"] += 1
+        self._blocked_dirty[user_id] = None
+
+    def get_offset(self) -> Optional[int]:
+        # Oxirgi qayta ishlangan update'dan keyingi update_id (getUpdates offset'i)
+        if self._offset_dirty is not None:
+            return self._offset_dirty
+        with self._db_lock:
+            row = self.db.execute("SELECT value FROM bot_meta WHERE name = 'update_offset'").fetchone()
+        return row[0] if row else None
+
+    def set_offset(self, offset: int) -> None:
+        self._offset_dirty = offset
+
+    def add_pending(self, update_id: int, data: str) -> None:
+        # Olingan, lekin hali tugallanmagan update — offset undan o'tgach Telegram uni qayta bermaydi
+        self._pending_dirty[update_id] = data
+
+    def finish_pending(self, update_id: int) -> None:
+        if self._pending_dirty.get(update_id) is not None:
+            # Bazaga hali yozilmagan edi — yozishga hojat yo'q
+            del self._pending_dirty[update_id]
+        else:
+            self._pending_dirty[update_id] = None
+
+    def pending_updates(self) -> List[Tuple[int, str]]:
+        with self._db_lock:
+            return self.db.execute("SELECT update_id, data FROM pending_updates ORDER BY update_id").fetchall()
+
+    def _write(self, batch: Dict[int, Tuple[str, int]], blocked: Dict[int, Optional[float]],
+               offset: Optional[int] = None, pending: Optional[Dict[int, Optional[str]]] = None) -> None:
+        # Hammasi bitta tranzaksiyada: offset hech qachon saqlanmagan pending'dan oldin surilmaydi
+        with self._db_lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO user_state (user_id, lang, page) VALUES (?, ?, ?)",
+                [(uid, lang, page) for uid, (lang, page) in batch.items()],
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO dm_blocked (user_id, until) VALUES (?, ?)",
+                [(uid, until) for uid, until in blocked.items() if until is not None],
+            )
+            self.db.executemany(
+                "DELETE FROM dm_blocked WHERE user_id = ?",
+                [(uid,) for uid, until in blocked.items() if until is None],
+            )
+            if pending:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO pending_updates (update_id, data) VALUES (?, ?)",
+                    [(uid, data) for uid, data in pending.items() if data is not None],
+                )
+                self.db.executemany(
+                    "DELETE FROM pending_updates WHERE update_id = ?",
+                    [(uid,) for uid, data in pending.items() if data is None],
+                )
+            if offset is not None:
+                self.db.execute("INSERT OR REPLACE INTO bot_meta (name, value) VALUES ('update_offset', ?)", (offset,))
+            self.db.commit()
+
+    def _take_dirty(self) -> Tuple[Dict[int, Tuple[str, int]], Dict[int, Optional[float]], Optional[int],
+                                   Dict[int, Optional[str]]]:
+        batch, self._dirty = self._dirty, {}
+        blocked, self._blocked_dirty = self._blocked_dirty, {}
+        offset, self._offset_dirty = self._offset_dirty, None
+        pending, self._pending_dirty = self._pending_dirty, {}
+        return batch, blocked, offset, pending
+
+    def flush(self) -> None:
+        batch, blocked, offset, pending = self._take_dirty()
+        if batch or blocked or offset is not None or pending:
+            self._write(batch, blocked, offset, pending)
+
+    async def flush_async(self) -> bool:
+        # Lock — ikki yozuv teskari tartibda tushib, eski offset yangisini bosmasin
+        async with self._flush_lock:
+            batch, blocked, offset, pending = self._take_dirty()
+            if not batch and not blocked and offset is None and not pending:
+                return True
+            try:
+                await asyncio.to_thread(self._write, batch, blocked, offset, pending)
+            except Exception as e:
+                # Yozilmaganlarini qaytaramiz — keyingi safar yana urinib ko'riladi
+                for uid, state in batch.items():
+                    self._dirty.setdefault(uid, state)
+                for uid, until in blocked.items():
+                    self._blocked_dirty.setdefault(uid, until)
+                if self._offset_dirty is None:
+                    self._offset_dirty = offset
+                for uid, data in pending.items():
+                    # Oraliqda tugagan update'ning o'chirilishi (None) ustun
+                    self._pending_dirty.setdefault(uid, data)
+                log.error("User state saqlanmadi: %s", e)
+                return False
+            return True
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(STATE_FLUSH_SECONDS)
+            await self.flush_async()
+
+    def close(self) -> None:
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+STATE = UserStateStore(STATE_DB)
+METRICS.collectors.append(
+    lambda: [("umra_bot_dm_blocked_cache_total", (("event", k),), v) for k, v in STATE.blocked_stats.items()]
+)
+
+# ----------------- EDIT DEDUP -----------------
+# Har bir (chat_id, message_id) uchun oxirgi ko'rsatilgan matn va klaviatura eslab qolinadi.
+# Yangi render aynan bir xil bo'lsa, API chaqirilmaydi ("message is not modified" ham bo'lmaydi).
+class EditDeduper:
+    def __init__(self, size: int = EDIT_CACHE_SIZE, debounce: float = TAP_DEBOUNCE_SECONDS):
+        self.size = size
+        self.debounce = debounce
+        self._rendered: "OrderedDict[Tuple[int, int], Tuple[Optional[str], Any]]" = OrderedDict()
+        self._taps: "OrderedDict[Tuple[int, int], Tuple[str, float]]" = OrderedDict()
+        self.skipped = 0
+        self.debounced = 0
+
+    @staticmethod
+    def _trim(cache: OrderedDict, size: int) -> None:
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def remember(self, chat_id: int, message_id: int, text: Optional[str], markup: Any) -> None:
+        key = (chat_id, message_id)
+        if text is None:
+            # Faqat klaviatura o'zgardi — matn avvalgidek
+            text = self._rendered.get(key, (None, None))[0]
+        self._rendered[key] = (text, markup)
+        self._rendered.move_to_end(key)
+        self._trim(self._rendered, self.size)
+
+    def unchanged(self, chat_id: int, message_id: int, text: Optional[str], markup: Any) -> bool:
+        prev = self._rendered.get((chat_id, message_id))
+        if prev is None:
+            return False
+        prev_text, prev_markup = prev
+        if text is not None and text != prev_text:
+            return False
+        same = prev_markup is markup or prev_markup == markup
+        if same:
+            self.skipped += 1
+        return same
+
+    def repeat_tap(self, chat_id: int, message_id: int, data: str) -> bool:
+        key = (chat_id, message_id)
+        now = time.monotonic()
+        prev = self._taps.get(key)
+        self._taps[key] = (data, now)
+        self._taps.move_to_end(key)
+        self._trim(self._taps, self.size)
+        if prev is not None and prev[0] == data and now - prev[1] < self.debounce:
+            self.debounced += 1
+            return True
+        return False
+
+EDITS = EditDeduper()
+METRICS.collectors.append(
+    lambda: [
+        ("umra_bot_edits_saved_total", (("reason", "unchanged"),), EDITS.skipped),
+        ("umra_bot_edits_saved_total", (("reason", "debounce"),), EDITS.debounced),
+    ]
+)
+
+def not_modified(e: BadRequest) -> bool:
+    return "not modified" in str(e).lower()
+
+async def edit_markup(q, markup: InlineKeyboardMarkup) -> None:
+    msg = q.message
+    if EDITS.unchanged(msg.chat.id, msg.message_id, None, markup):
+        return
+    try:
+        await q.edit_message_reply_markup(reply_markup=markup)
+    except BadRequest as e:
+        if not not_modified(e):
+            raise
+    EDITS.remember(msg.chat.id, msg.message_id, None, markup)
+
+async def edit_text(q, text: str, markup: InlineKeyboardMarkup) -> None:
+    msg = q.message
+    if EDITS.unchanged(msg.chat.id, msg.message_id, text, markup):
+        return
+    try:
+        await q.edit_message_text(text=text, reply_markup=markup, disable_web_page_preview=True)
+    except BadRequest as e:
+        if not not_modified(e):
+            raise
+    EDITS.remember(msg.chat.id, msg.message_id, text, markup)
+
+def remember_sent(msg, text: str, markup: Any) -> None:
+    if msg is not None:
+        EDITS.remember(msg.chat.id, msg.message_id, text, markup)
+
+# ----------------- POPULARITY -----------------
+# Har bir (kalit, til) uchun eksponensial so'nuvchi hisoblagich ("forward decay"): bosishda
+# bitta qo'shish, so'nish esa faqat o'qishda hisoblanadi. Vaqti-vaqti bilan eng ko'p
+# so'ralganlar bosh menyu tepasiga chiqariladi va javoblari keshga tayyorlab qo'yiladi.
+# Holat JSON faylga (jarayonning o'z tmp fayli + os.replace) fon oqimida yoziladi.
+# BOT_WORKERS rejimida har bir worker faqat o'z bosishlarini o'z fayliga ({path}.w<N>)
+# yozadi; boshqa fayllar (asosiy va qolgan worker'lar) har siklda o'qilib qo'shiladi —
+# bir-birining hisoblagichini ustidan yozmaydi va ikki marta sanamaydi.
+class FaqPopularity:
+    RESCALE_AT = 50.0  # exp() o'sib ketmasligi uchun shu ko'rsatkichda epoch suriladi
+
+    def __init__(self, path: str, half_life: float = POPULAR_HALF_LIFE_SECONDS, shard: Optional[int] = None):
+        self.base = path
+        self.path = path if shard is None else f"{path}.w{shard}"
+        self.rate = math.log(2) / half_life
+        self.epoch = time.time()
+        self._scores: Dict[Tuple[str, str], float] = {}  # shu jarayonning bosishlari
+        self._others: Dict[Tuple[str, str], float] = {}  # boshqa fayllardan, faqat o'qiladi
+        self._dirty = False
+        self.stats: Dict[str, int] = {"hits": 0, "reorders": 0, "checkpoints": 0}
+        self.load()
+
+    def hit(self, key: str, lang: str) -> None:
+        x = self.rate * (time.time() - self.epoch)
+        if x > self.RESCALE_AT:
+            self._rescale()
+            x = 0.0
+        self._scores[(key, lang)] = self._scores.get((key, lang), 0.0) + math.exp(x)
+        self._dirty = True
+        self.stats["hits"] += 1
+
+    def _rescale(self) -> None:
+        now = time.time()
+        factor = math.exp(-self.rate * (now - self.epoch))
+        self._scores = {k: v * factor for k, v in self._scores.items()}
+        self._others = {k: v * factor for k, v in self._others.items()}
+        self.epoch = now
+
+    def top(self, lang: str, n: int, content, min_score: float = 0.0) -> List[str]:
+        factor = math.exp(-self.rate * (time.time() - self.epoch))
+        scores = dict(self._others)
+        for k, v in self._scores.items():
+            scores[k] = scores.get(k, 0.0) + v
+        ranked = sorted(
+            ((score * factor, key) for (key, l), score in scores.items() if l == lang and key in content),
+            reverse=True,
+        )
+        return [key for score, key in ranked[:n] if score >= min_score]
+
+    def apply(self, render: RenderCache) -> None:
+        for lang in render.content.langs:
+            if render.set_hot(lang, self.top(lang, POPULAR_TOP_N, render.content, POPULAR_MIN_SCORE)):
+                self.stats["reorders"] += 1
+            render.warm(self.top(lang, POPULAR_WARM_N, render.content), lang)
+
+    def _read(self, path: str, epoch: float) -> Dict[Tuple[str, str], float]:
+        # Fayldagi qiymatlar epoch vaqtiga keltiriladi
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            factor = math.exp(-self.rate * (epoch - float(data["saved"])))
+            return {(key, lang): float(score) * factor for key, lang, score in data["scores"]}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.error("Popularity fayli o'qilmadi (%s): %s", path, e)
+            return {}
+
+    def _read_others(self, epoch: float) -> Dict[Tuple[str, str], float]:
+        shards = [p for p in glob.glob(glob.escape(self.base) + ".w*") if re.fullmatch(r"\.w\d+", p[len(self.base):])]
+        others: Dict[Tuple[str, str], float] = {}
+        for path in [self.base, *sorted(shards)]:
+            if path == self.path:
+                continue
+            for k, v in self._read(path, epoch).items():
+                others[k] = others.get(k, 0.0) + v
+        return others
+
+    def load(self) -> None:
+        self._scores = self._read(self.path, self.epoch)
+        self._others = self._read_others(self.epoch)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        # Qiymatlar hozirgi vaqtga keltiriladi — fayl epoch'ga bog'liq emas
+        now = time.time()
+        factor = math.exp(-self.rate * (now - self.epoch))
+        scores = [[key, lang, round(score * factor, 6)] for (key, lang), score in self._scores.items()]
+        return {"saved": now, "scores": [s for s in scores if s[2] > 1e-6]}
+
+    def _write(self, snapshot: Dict[str, Any]) -> None:
+        # tmp nomi jarayonga xos — bir vaqtda yozayotgan boshqa jarayon faylini buzmaydi
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=os.path.dirname(self.path) or "."
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def checkpoint(self) -> None:
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            self._write(self._snapshot())
+            self.stats["checkpoints"] += 1
+        except OSError as e:
+            self._dirty = True
+            log.error("Popularity saqlanmadi: %s", e)
+
+    async def checkpoint_async(self) -> None:
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, self._snapshot())
+            self.stats["checkpoints"] += 1
+        except OSError as e:
+            self._dirty = True
+            log.error("Popularity saqlanmadi: %s", e)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(POPULAR_REFRESH_SECONDS)
+            epoch = self.epoch
+            others = await asyncio.to_thread(self._read_others, epoch)
+            if self.epoch != epoch:
+                # O'qish paytida _rescale bo'lgan — qiymatlar yangi epoch'ga keltiriladi
+                factor = math.exp(-self.rate * (self.epoch - epoch))
+                others = {k: v * factor for k, v in others.items()}
+            self._others = others
+            self.apply(RENDER)
+            await self.checkpoint_async()
+
+POPULARITY = FaqPopularity(POPULARITY_FILE)
+METRICS.collectors.append(
+    lambda: [("umra_bot_popularity_total", (("event", k),), v) for k, v in POPULARITY.stats.items()]
+)
+
+# ----------------- GROUP BURSTS -----------------
+# Katta guruh bir vaqtda yozganda: xabarlar BURST_WINDOW_SECONDS davomida yig'iladi, keyin
+# har bir chat uchun deleteMessages (100 tadan), har bir foydalanuvchiga bitta DM.
+# Botni ishga tushirmagan foydalanuvchilar uchun topic ichida bitta eslatma (cooldown bilan),
+# ularga DM esa STATE.dm_blocked muddati tugaguncha yoki /start bosilguncha yuborilmaydi.
+class GroupMessage:
+    __slots__ = ("route", "chat_id", "thread_id", "message_id", "user_id", "first_name", "text")
+
+    def __init__(self, route: Route, chat_id: int, thread_id: Optional[int], message_id: int,
+                 user_id: int, first_name: str, text: str):
+        self.route = route
+        self.chat_id = chat_id
+        self.thread_id = thread_id
+        self.message_id = message_id
+        self.user_id = user_id
+        self.first_name = first_name
+        self.text = text
+
+def start_hint(lang: str, names: List[str], username: str) -> str:
+    who = ", ".join(names[:10]) + ("…" if len(names) > 10 else "")
+    link = f"https://t.me/{username}" if username else CONTACT_BOT
+    if lang == "kr":
+        return f"👋 {who}\nСаволингизга жавобни шахсий хабарда юбораман — аввал ботни ишга туширинг: {link}"
+    return f"👋 {who}\nSavolingizga javobni shaxsiy xabarda yuboraman — avval botni ishga tushiring: {link}"
+
+class GroupBurstPipeline:
+    MAX_DELETE_IDS = 100  # deleteMessages bir so'rovda 100 tagacha
+
+    def __init__(self, window: float = BURST_WINDOW_SECONDS):
+        self.window = window
+        self._pending: List[GroupMessage] = []
+        self._task: Optional[asyncio.Task] = None
+        self._scheduled = False
+        self._bot = None
+        # Vaqt tartibida (yangilangani oxiriga) — cooldown'i o'tganlari flush'da boshidan tashlanadi
+        self._last_dm: "OrderedDict[int, float]" = OrderedDict()
+        self._last_hint: "OrderedDict[Tuple[int, Optional[int]], float]" = OrderedDict()
+        self.stats: Dict[str, int] = {"messages": 0, "api_calls": 0, "naive_calls": 0}
+
+    def add(self, bot, item: GroupMessage) -> None:
+        self._bot = bot
+        self._pending.append(item)
+        if not self._scheduled:
+            self._scheduled = True
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    @staticmethod
+    def _expire(last: OrderedDict, cooldown: float, now: float) -> None:
+        while last and now - next(iter(last.values())) >= cooldown:
+            last.popitem(last=False)
+
+    async def flush(self) -> None:
+        # Partiya olinishi bilan keyingi xabar yangi flush rejalashtiradi — shu flush
+        # deleteMessages/DM'larni kutayotgan paytda kelganlar ham qolib ketmaydi
+        self._scheduled = False
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        calls = 0
+
+        deletes: Dict[int, List[int]] = {}
+        latest: Dict[int, GroupMessage] = {}
+        questions: Dict[int, List[str]] = {}
+        for item in batch:
+            if item.route.redirect != "dm_keep":
+                deletes.setdefault(item.chat_id, []).append(item.message_id)
+            if item.route.redirect in ("dm", "dm_keep"):
+                latest[item.user_id] = item
+                questions.setdefault(item.user_id, []).append(item.text)
+
+        for chat_id, ids in deletes.items():
+            for i in range(0, len(ids), self.MAX_DELETE_IDS):
+                calls += 1
+                try:
+                    await self._bot.delete_messages(chat_id, ids[i:i + self.MAX_DELETE_IDS], rate_limit_args=PRIORITY_BULK)
+                except Exception:
+                    METRICS.error("group_delete")
+
+        now = time.monotonic()
+        self._expire(self._last_dm, DM_COOLDOWN_SECONDS, now)
+        self._expire(self._last_hint, HINT_COOLDOWN_SECONDS, now)
+        targets = []
+        for user_id, item in latest.items():
+            if STATE.dm_blocked(user_id):
+                continue
+            if now - self._last_dm.get(user_id, -DM_COOLDOWN_SECONDS) < DM_COOLDOWN_SECONDS:
+                continue
+            self._last_dm[user_id] = now
+            self._last_dm.move_to_end(user_id)
+            targets.append((item, questions[user_id]))
+        results = await asyncio.gather(*(self._send_dm(item, texts) for item, texts in targets))
+        calls += len(targets)
+
+        # DM yetib bormaganlar — botni ishga tushirmagan yoki bloklagan
+        blocked: Dict[Tuple[int, Optional[int]], List[GroupMessage]] = {}
+        for (item, _), ok in zip(targets, results):
+            if not ok:
+                STATE.block_dm(item.user_id)
+                blocked.setdefault((item.chat_id, item.thread_id), []).append(item)
+        for (chat_id, thread_id), items in blocked.items():
+            if now - self._last_hint.get((chat_id, thread_id), -HINT_COOLDOWN_SECONDS) < HINT_COOLDOWN_SECONDS:
+                continue
+            self._last_hint[(chat_id, thread_id)] = now
+            self._last_hint.move_to_end((chat_id, thread_id))
+            calls += 1
+            try:
+                await self._bot.send_message(
+                    chat_id=chat_id,
+                    message_thread_id=thread_id,
+                    text=start_hint(items[0].route.lang, [i.first_name for i in items], self._bot.username or ""),
+                    disable_web_page_preview=True,
+                    rate_limit_args=PRIORITY_BULK,
+                )
+            except Exception:
+                METRICS.error("group_hint")
+
+        # Oddiy usulda: har bir xabarga bitta deleteMessage + bitta DM
+        naive = sum(1 for i in batch if i.route.redirect != "dm_keep") + sum(
+            1 for i in batch if i.route.redirect in ("dm", "dm_keep")
+        )
+        self.stats["messages"] += len(batch)
+        self.stats["api_calls"] += calls
+        self.stats["naive_calls"] += naive
+        if len(batch) > 1:
+            log.info("🧹 Burst: %s xabar, %s foydalanuvchi | API: %s ta (oddiy usulda %s)",
+                     len(batch), len(latest), calls, naive)
+
+    async def _send_dm(self, item: GroupMessage, texts: List[str]) -> bool:
+        # Bir nechta xabardan birinchi mos kelgan savolga javob, topilmasa — menyu
+        text = markup = None
+        for question in texts:
+            key = get_matcher().match(question)
+            lang = text_lang(question)
+            answer = RENDER.answer(key, lang, item.route.links) if key else None
+            if answer is not None:
+                METRICS.inc("umra_bot_faq_hits_total", (("key", key), ("source", "group")))
+                POPULARITY.hit(key, lang)
+                text, markup = answer, RENDER.answer_kb(lang, 0)
+                break
+        if text is None:
+            lang, page = STATE.get(item.user_id, (item.route.lang, 0))
+            text, markup = RENDER.start(lang), RENDER.menu(page, lang)
+
+        try:
+            msg = await self._bot.send_message(
+                chat_id=item.user_id,
+                text=text,
+                reply_markup=markup,
+                disable_web_page_preview=True,
+                rate_limit_args=PRIORITY_BULK,
+            )
+        except Forbidden:
+            return False
+        except Exception:
+            METRICS.error("group_dm")
+            return True
+        remember_sent(msg, text, markup)
+        return True
+
+GROUP_PIPELINE = GroupBurstPipeline()
+METRICS.collectors.append(
+    lambda: [("umra_bot_group_burst_total", (("event", k),), v) for k, v in GROUP_PIPELINE.stats.items()]
+)
+
 # ----------------- HANDLERS -----------------
+@instrumented("start_cmd")
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.effective_chat or not update.message:
         return
     if not chat_allowed(update.effective_chat.id):
         return
 
-    lang = "uz"
-    await update.message.reply_text(
-        start_text(lang),
-        reply_markup=build_faq_menu(page=0, lang=lang)
+    lang, page = STATE.get(update.effective_user.id) if update.effective_user else UserStateStore.DEFAULT
+    text, markup = RENDER.start(lang), RENDER.menu(page, lang)
+    msg = await update.message.reply_text(
+        text,
+        reply_markup=markup
     )
+    remember_sent(msg, text, markup)
+
+async def on_menu(q, cb: Callback) -> None:
+    # Sahifa/bo'lim almashishi va til tugmasi — faqat klaviatura o'zgaradi
+    STATE.set(q.from_user.id, RENDER.lang(cb.lang), cb.page)
+    await edit_markup(q, RENDER.menu(cb.page, cb.lang))
+
+async def on_faq(q, cb: Callback) -> None:
+    key = RENDER.tree.faq_key(cb.faq)
+    text = RENDER.answer(key, cb.lang) if key else None
+    if text is None:
+        await q.message.reply_text("Topilmadi.")
+        return
+    STATE.set(q.from_user.id, cb.lang, cb.page)
+    METRICS.inc("umra_bot_faq_hits_total", (("key", key), ("source", "callback")))
+    POPULARITY.hit(key, cb.lang)
+
+    await edit_text(q, text, RENDER.answer_kb(cb.lang, cb.page))
 
+async def on_back(q, cb: Callback) -> None:
+    STATE.set(q.from_user.id, RENDER.lang(cb.lang), cb.page)
+    await edit_text(q, RENDER.start(cb.lang), RENDER.menu(cb.page, cb.lang))
+
+CALLBACK_ROUTES: Dict[int, Callable[[Any, Callback], Awaitable[None]]] = {
+    OP_PAGE: on_menu,
+    OP_LANG: on_menu,
+    OP_FAQ: on_faq,
+    OP_BACK: on_back,
+}
+
+@instrumented("callback_handler", callback_action)
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     if not q or not q.message:
@@ -411,103 +2306,142 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = (q.data or "").strip()
     await q.answer()
 
-    if data.startswith("page:"):
-        _, page_s, lang = data.split(":")
-        page = int(page_s)
-        await q.edit_message_reply_markup(reply_markup=build_faq_menu(page, lang))
+    # Bir tugmani ketma-ket tez bosish — bitta edit yetarli
+    if EDITS.repeat_tap(q.message.chat.id, q.message.message_id, data):
         return
 
-    if data.startswith("lang:"):
-        _, lang, page_s = data.split(":")
-        page = int(page_s)
-        await q.edit_message_reply_markup(reply_markup=build_faq_menu(page, lang))
-        return
-
-    if data.startswith("faq:"):
-        _, key, lang, page_s = data.split(":")
-        page = int(page_s)
-
-        if key not in FAQ:
-            await q.message.reply_text("Topilmadi.")
-            return
-
-        text = FAQ[key][lang].strip()
-        if key in PROMO_KEYS:
-            text += promo_block(lang)
-
-        await q.edit_message_text(text=text, reply_markup=build_answer_kb(lang, page), disable_web_page_preview=True)
-        return
-
-    if data.startswith("back:"):
-        _, lang, page_s = data.split(":")
-        page = int(page_s)
-        await q.edit_message_text(
-            text=start_text(lang),
-            reply_markup=build_faq_menu(page=page, lang=lang),
-            disable_web_page_preview=True,
-        )
+    cb = decode_callback(data, RENDER.tree)
+    if cb is None:
+        METRICS.error("callback_decode")
         return
+    if cb.stale:
+        # Content yangilanganidan oldingi tugma — raqamlari endi boshqa savolni bildiradi,
+        # shuning uchun taxmin qilinmaydi: foydalanuvchiga yangi bosh menyu ko'rsatiladi
+        lang, _ = STATE.get(q.from_user.id)
+        cb = Callback(OP_BACK, lang, 0)
+    await CALLBACK_ROUTES[cb.op](q, cb)
 
+@instrumented("deep_start_cmd", deep_start_action)
 async def deep_start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message:
         return
 
+    if update.effective_user:
+        # /start bosgan foydalanuvchiga yana DM yuborish mumkin
+        STATE.unblock_dm(update.effective_user.id)
+
     args = context.args or []
     if not args:
         return await start_cmd(update, context)
 
-    payload = args[0].strip()
-    if payload.startswith("faq_"):
-        key = payload.replace("faq_", "", 1)
-        lang = "uz"
-        if key in FAQ:
-            text = FAQ[key][lang].strip()
-            if key in PROMO_KEYS:
-                text += promo_block(lang)
-            await update.message.reply_text(text, disable_web_page_preview=True)
-            await update.message.reply_text(start_text(lang), reply_markup=build_faq_menu(0, lang))
+    target = RENDER.deep_links.get(args[0].strip())
+    if target is not None:
+        key, link_lang = target
+        user = update.effective_user
+        lang, page = STATE.get(user.id) if user else UserStateStore.DEFAULT
+        if link_lang is not None and link_lang != lang:
+            lang = link_lang
+            if user:
+                STATE.set(user.id, lang, page)
+        text = RENDER.answer(key, lang)
+        if text is not None:
+            METRICS.inc("umra_bot_faq_hits_total", (("key", key), ("source", "deep_link")))
+            POPULARITY.hit(key, lang)
+            # Javob va menyu bitta xabarda — bitta so'rov, bitta limit tokeni
+            markup = RENDER.menu(page, lang)
+            msg = await update.message.reply_text(text, reply_markup=markup, disable_web_page_preview=True)
+            remember_sent(msg, text, markup)
             return
 
     return await start_cmd(update, context)
 
+@instrumented("group_text_handler")
 async def group_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Guruhda kim savol yozsa: o‘chiradi, shaxsiyga menyu yuboradi
+    # Guruhda kim savol yozsa: o‘chiradi, shaxsiyga javob (topilsa) yoki menyu yuboradi (GROUP BURSTS)
     if not update.effective_chat or not update.message:
         return
     if not chat_allowed(update.effective_chat.id):
         return
 
     if update.effective_chat.type in (ChatType.GROUP, ChatType.SUPERGROUP):
-        # ✅ Faqat bitta topic ichida ishlasin
+        # ✅ Faqat routing jadvalidagi (chat, topic) ichida ishlasin
         current_tid = getattr(update.effective_message, "message_thread_id", None)
-        if current_tid != ONLY_TOPIC_ID:
+        route = ROUTES.lookup(update.effective_chat.id, current_tid)
+        if route is None or route.redirect == "off":
             return
 
         user = update.effective_user
         if not user:
             return
 
-        try:
-            await update.message.delete()
-        except Exception:
-            pass
+        GROUP_PIPELINE.add(context.bot, GroupMessage(
+            route=route,
+            chat_id=update.effective_chat.id,
+            thread_id=current_tid,
+            message_id=update.message.message_id,
+            user_id=user.id,
+            first_name=user.first_name,
+            text=update.message.text or "",
+        ))
 
-        try:
-            await context.bot.send_message(
-                chat_id=user.id,
-                text=start_text("uz"),
-                reply_markup=build_faq_menu(0, "uz"),
-                disable_web_page_preview=True,
-            )
-        except Exception:
-            pass
+@instrumented("inline_query_handler")
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    iq = update.inline_query
+    if not iq:
+        return
+
+    query = iq.query or ""
+    lang = RENDER.lang(text_lang(query))
+    results = []
+    for key in get_inline().lookup(query, lang):
+        art = RENDER.article(key, lang)
+        if art is not None:
+            results.append(art)
+
+    await iq.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
 
 # ----------------- MAIN -----------------
-def main():
-    if not BOT_TOKEN:
-        raise RuntimeError("BOT_TOKEN yo‘q. Railway Variables ga BOT_TOKEN qo‘ying.")
+METRICS_SERVER: Optional[asyncio.AbstractServer] = None
+BACKGROUND: List[asyncio.Task] = []
+
+async def post_init(app: Application) -> None:
+    global METRICS_SERVER
+    # Fon vazifalari post_stop'da to'xtatiladi
+    BACKGROUND.append(asyncio.create_task(STATE.run()))
+    POPULARITY.apply(RENDER)
+    BACKGROUND.append(asyncio.create_task(POPULARITY.run()))
+    if METRICS_PORT:
+        METRICS_SERVER = await asyncio.start_server(serve_metrics, "0.0.0.0", METRICS_PORT)
+        log.info("📈 /metrics: %s-port", METRICS_PORT)
+    if CONTENT_PACK or ROUTES_FILE:
+        BACKGROUND.append(asyncio.create_task(watch_files()))
+
+async def post_stop(app: Application) -> None:
+    # Bot hali yopilmagan — navbatdagi o'chirishlar shu yerda yuboriladi
+    for task in BACKGROUND:
+        task.cancel()
+    BACKGROUND.clear()
+    if METRICS_SERVER is not None:
+        METRICS_SERVER.close()
+    await GROUP_PIPELINE.flush()
 
-    app = Application.builder().token(BOT_TOKEN).build()
+async def post_shutdown(app: Application) -> None:
+    STATE.close()
+    POPULARITY.checkpoint()
+    log.info("Outbound: %s", OUTBOUND.stats)
+
+def build_application(updater: bool = True, processor: Optional[BaseUpdateProcessor] = None) -> Application:
+    builder = Application.builder().token(BOT_TOKEN).rate_limiter(OUTBOUND)
+    builder = builder.post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown)
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL}/bot")
+    if not updater:
+        builder = builder.updater(None)
+    if processor is None and CONCURRENT_UPDATES > 1:
+        processor = ChatOrderedUpdateProcessor(CONCURRENT_UPDATES)
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    app = builder.build()
 
     # /start (deep-link ham ishlasin)
     app.add_handler(CommandHandler("start", deep_start_cmd))
@@ -515,14 +2449,451 @@ def main():
     # callback
     app.add_handler(CallbackQueryHandler(callback_handler))
 
+    # @bot matn — inline qidiruv
+    app.add_handler(InlineQueryHandler(inline_query_handler))
+
     # Guruhdagi oddiy textlarni ushlab qolamiz
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, group_text_handler))
+    return app
+
+async def process_one_update(data: Dict[str, Any]) -> None:
+    # Scale-to-zero: bitta update qayta ishlanadi, navbatdagi DM/o'chirishlar va state
+    # yozib bo'lingach qaytadi. Updater, fon vazifalari va metrics server ishga tushmaydi.
+    app = build_application(updater=False)
+    await app.initialize()
+    POPULARITY.apply(RENDER)
+    try:
+        await app.process_update(Update.de_json(data, app.bot))
+        await post_stop(app)
+    finally:
+        await app.shutdown()
+        await post_shutdown(app)
+
+def webhook_secret() -> str:
+    if WEBHOOK_SECRET:
+        return WEBHOOK_SECRET
+    log.warning("WEBHOOK_SECRET berilmagan — tasodifiy secret yaratildi (webhook_once.py uchun uni o'zingiz bering)")
+    return secrets.token_urlsafe(32)
+
+def run_updates(app: Application) -> None:
+    if WEBHOOK_URL:
+        # Telegram o'zi kutib turgan update'larni saqlaydi — restartda ular yo'qolmasin.
+        # Update navbatga qo'yiladi va HTTP javob darhol qaytadi, qayta ishlash o'sha handlerlarda.
+        # Secret'siz so'rov 403 oladi.
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+            secret_token=webhook_secret(),
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=False,
+        )
+        return
+
+    asyncio.run(run_durable_polling(app))
+
+# ----------------- LIFECYCLE -----------------
+# Polling o'zimizda. Olingan har bir update avval bazaga (pending_updates) yoziladi, keyingi
+# getUpdates esa offset'ni olinganlarning hammasidan keyinga suradi — sekin update yangi
+# update'lar olinishini to'xtatmaydi. Pending yozuvlari va offset bitta tranzaksiyada
+# saqlanadi, shuning uchun Telegram tasdiqlangan update'ni unutgan paytda u bazada bo'ladi.
+# Update tugagach yozuvi o'chiriladi; restart/deploy'da qolgan (tugallanmagan) yozuvlar
+# offset'dan oldin tartib bilan qayta ishlanadi, tugaganlari qayta ishlanmaydi.
+# SIGTERM'da yangi update olinmaydi, ishlanayotganlar DRAIN_SECONDS kutiladi.
+async def process_in(app: Application, update: Update) -> None:
+    # app.update_processor orqali — CONCURRENT_UPDATES va chat tartibi saqlanadi
+    coroutine = app.process_update(update)
+    try:
+        await app.update_processor.process_update(update, coroutine)
+    except asyncio.CancelledError:
+        # Navbati kelmasdan bekor qilingan (drain) — coroutine yopiladi, "never awaited" bo'lmasin
+        coroutine.close()
+        raise
+
+class DurablePoller:
+    MAX_INFLIGHT = 500  # bir vaqtda ishlanayotgan update'lar chegarasi — xotira uchun
+    BATCH = 100  # getUpdates limiti (Telegram maksimumi)
+
+    def __init__(self, app: Application, store: UserStateStore, backlog_rate: float = BACKLOG_RATE):
+        self.app = app
+        self.store = store
+        self.backlog = TokenBucket(1, 1 / backlog_rate)  # sig'imi 1 — boshida ham portlash yo'q
+        self._inflight: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._max_seen = -1
+        self._offset = 0  # bazaga saqlangan, getUpdates'ga beriladigan offset
+        self._unsaved = False  # saqlanmagan pending bor — offset hali surilmaydi
+        self._changed = asyncio.Event()
+        self._dirty = asyncio.Event()  # bazaga yozilmagan pending/tugagan yozuv bor
+        self._poll_task: Optional[asyncio.Task] = None
+        self._commit_task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"processed": 0, "backlog": 0, "resumed": 0, "redelivered": 0, "abandoned": 0}
+
+    def watermark(self) -> int:
+        # Bundan kichik barcha update'lar tugallangan
+        return min(self._inflight) if self._inflight else self._max_seen + 1
+
+    def start(self) -> asyncio.Task:
+        offset = self.store.get_offset()
+        if offset is not None:
+            self._max_seen = offset - 1
+            self._offset = offset
+            log.info("▶️ Polling offset %s dan davom etadi", offset)
+        self._commit_task = asyncio.create_task(self._commit())
+        self._poll_task = asyncio.create_task(self._poll())
+        return self._poll_task
+
+    async def _save(self) -> None:
+        # Pending, tugaganlarning o'chirilishi va offset — bitta tranzaksiyada
+        saved = None
+        if self._unsaved:
+            saved = self._max_seen + 1
+            self._unsaved = False
+            self.store.set_offset(saved)
+        if not await self.store.flush_async():
+            self._unsaved = self._unsaved or saved is not None
+        elif saved is not None:
+            self._offset = max(self._offset, saved)
+
+    async def _commit(self) -> None:
+        # O'zgarish bo'lishi bilan yoziladi (yozuv davomida yig'ilganlari keyingi partiyada):
+        # SIGKILL'da tugagan update qayta ishlanmasin, Telegram'ga tasdiq ham kechikmasin
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            # shield — stop() bekor qilganda boshlangan yozuv chala qolmasin
+            await asyncio.shield(self._save())
+
+    async def _resume(self) -> None:
+        # O'tgan safar tugallanmagan update'lar — Telegram ularni endi bermaydi
+        rows = await asyncio.to_thread(self.store.pending_updates)
+        for update_id, data in rows:
+            try:
+                update = Update.de_json(json.loads(data), self.app.bot)
+            except Exception:
+                log.exception("Pending update %s o'qilmadi", update_id)
+                self.store.finish_pending(update_id)
+                continue
+            await asyncio.sleep(self.backlog.reserve())
+            self._max_seen = max(self._max_seen, update_id)
+            self._dispatch(update)
+            self.stats["resumed"] += 1
+        if rows:
+            log.info("♻️ %s ta tugallanmagan update qayta ishlanmoqda", len(rows))
+
+    def _dispatch(self, update: Update) -> None:
+        self._inflight.add(update.update_id)
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _poll(self) -> None:
+        bot = self.app.bot
+        in_backlog = True
+        await self._resume()
+        while True:
+            await self._room()
+            if self._unsaved:
+                # Pending va yangi offset saqlanmaguncha Telegram'ga tasdiq berilmaydi
+                await self._save()
+            try:
+                updates = await bot.get_updates(
+                    offset=self._offset, timeout=0 if in_backlog else POLL_TIMEOUT,
+                    limit=self.BATCH,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            except InvalidToken:
+                raise
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except TelegramError as e:
+                log.warning("getUpdates: %s", e)
+                await asyncio.sleep(1)
+                continue
+
+            # Offset saqlanmay qolgan bo'lsa — bu update'lar allaqachon ishlanmoqda
+            fresh = [u for u in updates if u.update_id > self._max_seen]
+            self.stats["redelivered"] += len(updates) - len(fresh)
+            if not fresh:
+                if not updates and in_backlog:
+                    in_backlog = False
+                    log.info("✅ To'planib qolgan update'lar tugadi (%s ta)", self.stats["backlog"])
+                continue
+
+            for update in fresh:
+                if in_backlog:
+                    # Restartdan keyingi navbat API'ni bosib ketmasin
+                    await asyncio.sleep(self.backlog.reserve())
+                    self.stats["backlog"] += 1
+                self._max_seen = update.update_id
+                self.store.add_pending(update.update_id, json.dumps(update.to_dict(), ensure_ascii=False))
+                self._unsaved = True
+                self._dirty.set()
+                self._dispatch(update)
+
+    async def _room(self) -> None:
+        # To'liq partiyaga joy bo'lguncha yangi update so'ralmaydi — har bir bo'shagan joy uchun
+        # mayda getUpdates (va bazaga yozish) CPU'ni worker'lardan tortib olmasin
+        while len(self._inflight) > self.MAX_INFLIGHT - self.BATCH:
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def _process(self, update: Update) -> None:
+        # Bekor qilingan (drain ulgurmagan) update pending'da qoladi — keyingi safar qayta ishlanadi
+        try:
+            await process_in(self.app, update)
+        except Exception:
+            log.exception("Update %s qayta ishlanmadi", update.update_id)
+        self._inflight.discard(update.update_id)
+        self.store.finish_pending(update.update_id)
+        self._dirty.set()
+        self.stats["processed"] += 1
+        self._changed.set()
+
+    async def stop(self, deadline: float = DRAIN_SECONDS) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            await asyncio.gather(self._poll_task, return_exceptions=True)
+        if self._tasks:
+            log.info("⏳ %s ta update tugashini kutamiz (%ss gacha)", len(self._tasks), deadline)
+            _, pending = await asyncio.wait(set(self._tasks), timeout=deadline)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            self.stats["abandoned"] += len(pending)
+        if self._commit_task is not None:
+            self._commit_task.cancel()
+            await asyncio.gather(self._commit_task, return_exceptions=True)
+        if self._unsaved:
+            self.store.set_offset(self._max_seen + 1)
+        await self.store.flush_async()
+        log.info("Polling to'xtadi | offset %s | tugallanmagan %s | %s",
+                 self._max_seen + 1, len(self._inflight), self.stats)
+
+async def run_durable_polling(app: Application) -> None:
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    poller = DurablePoller(app, STATE)
+    METRICS.collectors.append(
+        lambda: [("umra_bot_polling_total", (("event", k),), v) for k, v in poller.stats.items()]
+    )
+    await app.initialize()
+    try:
+        # Webhook o'rnatilgan bo'lsa getUpdates ishlamaydi; kutayotgan update'lar saqlanadi
+        await app.bot.delete_webhook(drop_pending_updates=False)
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        polling = poller.start()
+        stopping = asyncio.create_task(stop.wait())
+        await asyncio.wait({stopping, polling}, return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+        await poller.stop()
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        if not polling.cancelled():
+            polling.result()  # masalan InvalidToken — jarayon xato bilan chiqsin
+    finally:
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+# ----------------- WORKERS -----------------
+# Broker — har bir worker uchun alohida multiprocessing.Queue. Bitta chatning update'lari
+# doim bitta worker'ga tushadi, shuning uchun chat ichidagi tartib saqlanadi. Guruh ham
+# butunligicha bitta worker'da: uning 20/daqiqa bucket'i, deleteMessages partiyasi va topic
+# eslatmasi cooldown'i aniq qoladi. Umumiy 30 xabar/s limiti worker'lar orasida teng bo'linadi.
+# Worker update'ni tugatgach update_id'ni umumiy "done" navbatiga qaytaradi; qabul qiluvchidagi
+# forward shungacha kutadi — DurablePoller update'ni faqat shundan keyin tugagan deb hisoblaydi.
+# SIGTERM'da worker navbatdan yangi update olmaydi, boshlanganlarini DRAIN_SECONDS kutadi.
+# Cheklov: worker jarayoni o'lib qolsa, unga yuborilgan update'lar qabul qiluvchi restart
+# bo'lguncha pending'da qoladi (yo'qolmaydi, lekin o'sha paytgacha javobsiz).
+def shard_of(update: Update, workers: int) -> int:
+    # update_chat_key emas: u guruh matnlarini foydalanuvchi bo'yicha ajratadi
+    chat = update.effective_chat
+    if chat:
+        return chat.id % workers
+    user = update.effective_user
+    return (user.id if user else 0) % workers
+
+async def worker_loop(index: int, inbox, done, ready, workers: int) -> None:
+    global OUTBOUND, METRICS_PORT, POPULARITY, STATE
+    # Bucket'lar to'la boshlansa, restartdagi backlog hamma worker'da birdan portlaydi
+    OUTBOUND = OutboundLimiter(global_rate=(GLOBAL_RATE[0] / workers, GLOBAL_RATE[1]), burst=False)
+    STATE = UserStateStore(STATE_DB, shared=True)
+    # Har bir worker o'z popularity fayliga yozadi, qolganlarini o'qiydi
+    POPULARITY = FaqPopularity(POPULARITY_FILE, shard=index)
+    if METRICS_PORT:
+        METRICS_PORT += index + 1
+    app = build_application(updater=False)
+    loop = asyncio.get_running_loop()
+
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    parent = multiprocessing.parent_process()
+    tasks: Set[asyncio.Task] = set()
+    finished: List[int] = []
+
+    def report() -> None:
+        # Bir loop aylanishida tugaganlar bitta xabar bilan qaytariladi
+        done.put(finished[:])
+        finished.clear()
+
+    async def process(update: Update) -> None:
+        try:
+            await process_in(app, update)
+        except Exception:
+            log.exception("Update %s qayta ishlanmadi", update.update_id)
+        if not finished:
+            loop.call_soon(report)
+        finished.append(update.update_id)
+
+    await app.initialize()
+    await post_init(app)
+    await app.start()
+    ready.release()
+    log.info("👷 Worker %s/%s tayyor", index + 1, workers)
+    try:
+        while not stop.is_set():
+            if parent is not None and not parent.is_alive():
+                # Qabul qiluvchi o'ldirilgan — tasdiqsiz update'lar uning pending'ida, restartda qayta ishlanadi
+                log.warning("Worker %s: qabul qiluvchi jarayon yo'q — to'xtaymiz", index + 1)
+                break
+            try:
+                # Timeout — SIGTERM'ni navbat bo'sh paytda ham sezish uchun
+                data = await loop.run_in_executor(None, inbox.get, True, WORKER_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            task = asyncio.create_task(process(Update.de_json(data, app.bot)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            log.info("⏳ Worker %s: %s ta update tugashini kutamiz (%ss gacha)", index + 1, len(tasks), DRAIN_SECONDS)
+            _, pending = await asyncio.wait(set(tasks), timeout=DRAIN_SECONDS)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        await app.stop()
+        await post_stop(app)
+        await app.shutdown()
+        await post_shutdown(app)
+
+def worker_main(index: int, inbox, done, ready, workers: int) -> None:
+    # Ctrl+C ni qabul qiluvchi jarayon boshqaradi, worker navbatdagi None'ni kutadi
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging()
+    asyncio.run(worker_loop(index, inbox, done, ready, workers))
+
+def run_sharded(workers: int) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(workers)]
+    done = ctx.Queue()
+    ready = ctx.Semaphore(0)  # har bir worker app.start()'dan keyin bir marta release qiladi
+    procs = [
+        ctx.Process(target=worker_main, args=(i, q, done, ready, workers), name=f"worker-{i}")
+        for i, q in enumerate(queues)
+    ]
+    for proc in procs:
+        proc.start()
+
+    # update_id -> worker tugatganda bajariladigan future
+    waiting: Dict[int, asyncio.Future] = {}
+
+    def read_done(loop: asyncio.AbstractEventLoop) -> None:
+        # Worker tugagan update_id'larni ro'yxat qilib yuboradi; None — to'xtash
+        while True:
+            update_ids = done.get()
+            if update_ids is None:
+                return
+            loop.call_soon_threadsafe(finish, update_ids)
+
+    def finish(update_ids: List[int]) -> None:
+        for update_id in update_ids:
+            fut = waiting.pop(update_id, None)
+            if fut is not None and not fut.done():
+                fut.set_result(None)
+
+    async def forward(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        fut = asyncio.get_running_loop().create_future()
+        waiting[update.update_id] = fut
+        queues[shard_of(update, workers)].put(update.to_dict())
+        try:
+            await fut
+        finally:
+            waiting.pop(update.update_id, None)
+        raise ApplicationHandlerStop
+
+    async def start_reader(app: Application) -> None:
+        threading.Thread(target=read_done, args=(asyncio.get_running_loop(),), name="worker-done", daemon=True).start()
+        # Polling hamma worker tayyor bo'lgach boshlanadi — aks holda backlog navbatlarda
+        # to'planib, worker'lar ishga tushganda BACKLOG_RATE'dan tez chiqib ketadi
+        for _ in procs:
+            while not await asyncio.to_thread(ready.acquire, True, WORKER_POLL_SECONDS):
+                dead = [proc.name for proc in procs if not proc.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Worker ishga tushmadi: {', '.join(dead)}")
+
+    async def stop_workers(app: Application) -> None:
+        for q in queues:
+            q.put(None)
+        for proc in procs:
+            await asyncio.to_thread(proc.join, 30)
+        done.put(None)
+
+    # Qabul qiluvchi o'zi hech narsa yubormaydi — limiter, state va metrics worker'larda.
+    # forward worker'ni kutib turadi, shuning uchun parallellik DurablePoller chegarasida.
+    builder = (
+        Application.builder().token(BOT_TOKEN).concurrent_updates(DurablePoller.MAX_INFLIGHT)
+        .post_init(start_reader).post_shutdown(stop_workers)
+    )
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL}/bot")
+    app = builder.build()
+    app.add_handler(TypeHandler(Update, forward), group=-1)
+    run_updates(app)
+
+def main():
+    if not BOT_TOKEN:
+        raise RuntimeError("BOT_TOKEN yo‘q. Railway Variables ga BOT_TOKEN qo‘ying.")
+    if WEBHOOK_SECRET and not WEBHOOK_SECRET_RE.fullmatch(WEBHOOK_SECRET):
+        raise RuntimeError("WEBHOOK_SECRET faqat A-Z, a-z, 0-9, _ va - belgilaridan (1-256 ta) iborat bo‘lishi kerak.")
 
     log.info(
-        "✅ Umra FAQ bot ishga tushdi | Allowed chat: %s | BOT_USERNAME: %s | Only topic: %s",
-        ALLOWED_CHAT_ID, BOT_USERNAME or "(yo‘q)", ONLY_TOPIC_ID
+        "✅ Umra FAQ bot ishga tushdi | Routes: %s | BOT_USERNAME: %s | Mode: %s | Concurrency: %s | Workers: %s",
+        ROUTES_FILE or f"chat {ALLOWED_CHAT_ID}, topic {ONLY_TOPIC_ID}", BOT_USERNAME or "(yo‘q)",
+        "webhook" if WEBHOOK_URL else "polling", CONCURRENT_UPDATES, BOT_WORKERS,
     )
-    app.run_polling(drop_pending_updates=True)
+
+    if BOT_WORKERS > 1:
+        run_sharded(BOT_WORKERS)
+        return
+
+    run_updates(build_application())
 
 if __name__ == "__main__":
-    main()
+    setup_logging()
+    if sys.argv[1:2] == ["pack"] and len(sys.argv) == 4:
+        # python bot.py pack faq.json faq.pack
+        compile_content_pack(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ["export"] and len(sys.argv) == 3:
+        # python bot.py export faq.json — ichki FAQ'ni pack manbasiga aylantirish
+        export_builtin_faq(sys.argv[2])
+    elif sys.argv[1:2] == ["once"] and len(sys.argv) == 3:
+        # python bot.py once update.json (yoki "-" — stdin): bitta update va chiqish
+        if sys.argv[2] == "-":
+            update_data = json.load(sys.stdin)
+        else:
+            with open(sys.argv[2], "r", encoding="utf-8") as f:
+                update_data = json.load(f)
+        asyncio.run(process_one_update(update_data))
+    else:
+        main()
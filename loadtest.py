@@ -0,0 +1,1173 @@
+# loadtest.py
+# Soxta Telegram Bot API serveri bilan yuklama sinovi — haqiqiy API'ga tegmaydi.
+#
+#   python loadtest.py --updates 2000 --rate 200 --latency-ms 40 --p429 0.01 --concurrency 16
+#
+# Bot o'zgarmagan holda (bot.build_application) ishga tushadi, faqat BOT_API_URL shu yerdagi
+# serverga qaratiladi. Update'lar getUpdates orqali beriladi: tugma bosishlar, faq_<key>
+# deep-linklar, topic ichidagi va tashqarisidagi guruh xabarlari. Oxirida har bir handler
+# turi uchun p50/p99 kechikish va umumiy o'tkazuvchanlik chiqariladi.
+#
+#   python loadtest.py startup --runs 5 --out startup.jsonl
+#
+# Sovuq start o'lchovi: `import bot` vaqti va yangi jarayon ishga tushganidan birinchi
+# sendMessage'gacha bo'lgan vaqt (webhook_once.py va oddiy polling rejimi). Natija har
+# release uchun --out fayliga bitta JSON qator bo'lib qo'shiladi.
+#
+#   python loadtest.py fuzz --cases 200000
+#
+# callback_data dekoderini tasodifiy va buzilgan payload'lar bilan tekshiradi: hech biri
+# istisno chiqarmasligi, menyudagi har bir tugma esa o'zgarmasdan qaytishi kerak.
+#
+#   python loadtest.py replay --updates 200 --p-sigkill 0.3
+#
+# Kutib turgan update'lar navbati bilan `python bot.py` qayta-qayta ishga tushiriladi va
+# tasodifiy paytda SIGTERM yoki SIGKILL bilan o'ldiriladi. Oxirida javobsiz qolgan va
+# ikki marta javob olgan update'lar hamda API'ga sekundiga eng ko'p yuborilgan xabarlar soni chiqadi.
+#
+#   python loadtest.py webhook --file updates.jsonl
+#
+# `python bot.py` webhook rejimida (WEBHOOK_URL) ishga tushadi va yozib olingan update'lar
+# POST qilinadi: avval secret'siz va noto'g'ri secret bilan (403, hech narsa yuborilmasligi
+# kerak), keyin setWebhook'dagi secret bilan — har biri qayta ishlanganini soxta API tekshiradi.
+#
+#   python loadtest.py workers --workers 1,2,4 --updates 2000
+#
+# `python bot.py` har bir BOT_WORKERS qiymati bilan ishga tushiriladi, update'lar bir zumda
+# beriladi va hammasi qayta ishlanguncha o'tgan vaqtdan upd/s hisoblanadi.
+#
+#   python loadtest.py match
+#
+# Guruh savollari matcher'i match_corpus.jsonl bo'yicha: to'g'ri topilgan, noto'g'ri javob,
+# javobsiz qolgan savollar va begona xabarlarga berilgan javoblar, bitta xabar uchun p50/p99 µs.
+#
+#   python loadtest.py taps --taps 50000
+#
+# Bitta tugma bosishining lokal narxi: eski yo'l (har safar menyu qurish) va RenderCache'dan
+# olish bir xil bosishlar ketma-ketligida, amal bo'yicha p50 va o'rtacha µs.
+
+import os
+import sys
+import json
+import time
+import logging
+import random
+import signal
+import asyncio
+import base64
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+TMP_DIR = tempfile.mkdtemp(prefix="umra_loadtest_")
+os.environ.setdefault("STATE_DB", os.path.join(TMP_DIR, "state.sqlite3"))
+os.environ.setdefault("POPULARITY_FILE", os.path.join(TMP_DIR, "popularity.json"))
+
+import bot  # noqa: E402
+
+bot.setup_logging()
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+TOKEN = "123456:LOADTEST"
+BOT_ID = 123456
+GROUP_ID = -1001234567890
+
+# Soxta server xabar yuborish/edit qilishda 429 qaytarishi mumkin, getUpdates/getMe — hech qachon
+THROTTLED_METHODS = frozenset({
+    "sendMessage", "editMessageText", "editMessageReplyMarkup", "deleteMessage", "deleteMessages",
+    "answerCallbackQuery", "answerInlineQuery",
+})
+
+# ----------------- FAKE BOT API -----------------
+class FakeBotApi:
+    def __init__(self, latency_ms: float, jitter_ms: float, p429: float, retry_after: int, rng: random.Random,
+                 unstarted: frozenset = frozenset()):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.rng = rng
+        # Botni ishga tushirmagan foydalanuvchilar — ularga sendMessage 403 qaytaradi
+        self.unstarted = unstarted
+        self.updates: List[Dict[str, Any]] = []
+        self.released: Dict[int, float] = {}
+        self._new = asyncio.Event()
+        self._message_id = 10_000
+        self.calls: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.forbidden = 0
+        self.first_call: Dict[str, float] = {}
+        self.sent_to: Counter = Counter()
+        self.sent_at: List[float] = []
+        self.answered: Set[str] = set()
+        self.deleted: Set[int] = set()
+        self.webhook: Dict[str, Any] = {}
+
+    def push(self, update: Dict[str, Any]) -> None:
+        self.released[update["update_id"]] = time.perf_counter()
+        self.updates.append(update)
+        self._new.set()
+
+    def _message(self, chat_id: int, text: str = "", reply_markup: Any = None) -> Dict[str, Any]:
+        self._message_id += 1
+        msg = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Umra FAQ"},
+            "text": text,
+        }
+        if reply_markup:
+            msg["reply_markup"] = reply_markup
+        return msg
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls[method] += 1
+        self.first_call.setdefault(method, time.perf_counter())
+        if method == "getUpdates":
+            return {"ok": True, "result": await self._get_updates(params)}
+        if method == "getMe":
+            return {"ok": True, "result": {
+                "id": BOT_ID, "is_bot": True, "first_name": "Umra FAQ", "username": "umra_loadtest_bot",
+                "can_join_groups": True, "can_read_all_group_messages": True, "supports_inline_queries": True,
+            }}
+
+        await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+        if method in THROTTLED_METHODS and self.rng.random() < self.p429:
+            self.throttled[method] += 1
+            return {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        if method == "sendMessage" and int(params["chat_id"]) in self.unstarted:
+            self.forbidden += 1
+            return {"ok": False, "error_code": 403, "description": "Forbidden: bot can't initiate conversation with a user"}
+        if method == "sendMessage":
+            self.sent_to[int(params["chat_id"])] += 1
+            self.sent_at.append(time.perf_counter())
+            return {"ok": True, "result": self._message(int(params["chat_id"]), params.get("text", ""), params.get("reply_markup"))}
+        if method == "editMessageText":
+            return {"ok": True, "result": self._message(int(params.get("chat_id") or 1), params.get("text", ""), params.get("reply_markup"))}
+        if method == "editMessageReplyMarkup":
+            return {"ok": True, "result": self._message(int(params.get("chat_id") or 1), "", params.get("reply_markup"))}
+        if method == "answerCallbackQuery":
+            self.answered.add(str(params.get("callback_query_id")))
+        elif method == "answerInlineQuery":
+            self.answered.add(str(params.get("inline_query_id")))
+        elif method in ("deleteMessage", "deleteMessages"):
+            self.deleted.update(int(i) for i in params.get("message_ids") or [params.get("message_id")])
+        elif method == "setWebhook":
+            self.webhook = params
+        return {"ok": True, "result": True}
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        # Tasdiqlangan update'lar tashlab yuboriladi (haqiqiy API kabi)
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.pop(0)
+        if not self.updates and timeout:
+            self._new.clear()
+            try:
+                await asyncio.wait_for(self._new.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Minimal HTTP/1.1 (keep-alive bilan) — httpx shu ulanishni qayta ishlatadi
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                _, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+
+                method = path.rstrip("/").rsplit("/", 1)[-1]
+                result = await self.call(method, parse_params(body, headers.get("content-type", "")))
+                payload = json.dumps(result).encode("utf-8")
+                status = "200 OK" if result["ok"] else f"{result['error_code']} Error"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+def parse_params(body: bytes, content_type: str) -> Dict[str, Any]:
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    params: Dict[str, Any] = {}
+    for k, v in parse_qsl(body.decode("utf-8"), keep_blank_values=True):
+        try:
+            params[k] = json.loads(v)
+        except ValueError:
+            params[k] = v
+    return params
+
+# ----------------- UPDATE STREAM -----------------
+KIND_WEIGHTS = (
+    ("tap", 60),
+    ("deep_link", 10),
+    ("group_topic", 20),
+    ("group_other", 10),
+)
+# --groups-only: faqat topic ichidagi xabarlar (Madinaga katta guruh kelgan payt)
+GROUP_ONLY_WEIGHTS = (("group_topic", 1),)
+
+INLINE_QUERIES = ("miqot", "ehrom", "zamzam suvi", "тавоф", "madina 3 kun", "rawza", "qubo", "sa", "umra tartibi", "")
+
+GROUP_TEXTS = (
+    "Madinada 3 kunda qayerga boray?",
+    "Эҳромга қандай ният қилинади",
+    "zamzam suvini qanday ichish kerak",
+    "Assalomu alaykum, taksi kerak",
+    "tavof necha marta aylaniladi",
+    "Равзага кириш",
+)
+
+class UpdateStream:
+    # Har bir foydalanuvchining ochiq xabari eslab qolinadi — tugmalar haqiqiy menyudan olinadi
+    def __init__(self, users: int, rng: random.Random, weights=KIND_WEIGHTS):
+        self.rng = rng
+        self.users = [500_000 + i for i in range(users)]
+        self.screens: Dict[int, Tuple[int, Any]] = {}
+        self._update_id = 0
+        self._message_id = 0
+        self.kinds = [k for k, _ in weights]
+        self.weights = [w for _, w in weights]
+
+    def _user(self, uid: int) -> Dict[str, Any]:
+        return {"id": uid, "is_bot": False, "first_name": f"U{uid}", "language_code": "uz"}
+
+    def _base(self) -> Dict[str, Any]:
+        self._update_id += 1
+        self._message_id += 1
+        return {"update_id": self._update_id}
+
+    def next(self) -> Tuple[str, Dict[str, Any]]:
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        uid = self.rng.choice(self.users)
+        upd = self._base()
+        now = int(time.time())
+
+        if kind == "tap":
+            message_id, markup = self.screens.get(uid) or (self._message_id, bot.RENDER.menu(0, "uz"))
+            buttons = [b for row in markup.inline_keyboard for b in row if b.callback_data]
+            button = self.rng.choice(buttons)
+            upd["callback_query"] = {
+                "id": str(upd["update_id"]),
+                "from": self._user(uid),
+                "chat_instance": str(uid),
+                "data": button.callback_data,
+                "message": {
+                    "message_id": message_id, "date": now,
+                    "chat": {"id": uid, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Umra FAQ"},
+                    "text": "menu",
+                },
+            }
+            self.screens[uid] = (message_id, self._after_tap(button.callback_data, markup))
+            return "tap:" + bot.CALLBACK_OPS[bot.decode_callback(button.callback_data, bot.RENDER.tree).op], upd
+
+        if kind == "inline":
+            upd["inline_query"] = {
+                "id": str(upd["update_id"]), "from": self._user(uid),
+                "query": self.rng.choice(INLINE_QUERIES), "offset": "",
+            }
+            return kind, upd
+
+        if kind == "deep_link":
+            key = self.rng.choice(bot.CONTENT.top_keys)
+            # Promo postlardagi kirill havolalar ham (faq_kr_<key>)
+            lang = "kr" if self.rng.random() < 0.3 else "uz"
+            text = f"/start faq_kr_{key}" if lang == "kr" else f"/start faq_{key}"
+            upd["message"] = {
+                "message_id": self._message_id, "date": now,
+                "chat": {"id": uid, "type": "private"}, "from": self._user(uid),
+                "text": text, "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            }
+            self.screens[uid] = (self._message_id + 1, bot.RENDER.menu(0, lang))
+            return "deep_link", upd
+
+        thread_id = bot.ONLY_TOPIC_ID if kind == "group_topic" else bot.ONLY_TOPIC_ID + 7
+        upd["message"] = {
+            "message_id": self._message_id, "date": now,
+            "chat": {"id": GROUP_ID, "type": "supergroup", "title": "Umra", "is_forum": True},
+            "from": self._user(uid), "text": self.rng.choice(GROUP_TEXTS),
+            "message_thread_id": thread_id, "is_topic_message": True,
+        }
+        return kind, upd
+
+    def _after_tap(self, data: str, markup: Any) -> Any:
+        # Keyingi bosish uchun ekranda qaysi klaviatura turishini taxmin qiladi
+        cb = bot.decode_callback(data, bot.RENDER.tree)
+        if cb.op == bot.OP_FAQ:
+            return bot.RENDER.answer_kb(cb.lang, cb.page)
+        return bot.RENDER.menu(cb.page, cb.lang)
+
+# ----------------- HARNESS -----------------
+class TimedProcessor(bot.ChatOrderedUpdateProcessor):
+    # Update API'ga chiqarilgan paytdan handler tugaguncha bo'lgan vaqtni yozadi
+    def __init__(self, max_concurrent_updates: int, api: FakeBotApi, kinds: Dict[int, str]):
+        super().__init__(max_concurrent_updates)
+        self.api = api
+        self.kinds = kinds
+        self.samples: Dict[str, List[float]] = {}
+        self.done = 0
+        self.all_done = asyncio.Event()
+        self.expected = 0
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            uid = getattr(update, "update_id", None)
+            released = self.api.released.get(uid)
+            if released is not None:
+                kind = self.kinds.get(uid, "other")
+                self.samples.setdefault(kind, []).append(time.perf_counter() - released)
+            self.done += 1
+            if self.done >= self.expected:
+                self.all_done.set()
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    stream = UpdateStream(args.users, rng, GROUP_ONLY_WEIGHTS if args.groups_only else KIND_WEIGHTS)
+    unstarted = frozenset(rng.sample(stream.users, int(len(stream.users) * args.unstarted)))
+    api = FakeBotApi(args.latency_ms, args.jitter_ms, args.p429, args.retry_after, rng, unstarted)
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    bot.BOT_TOKEN = TOKEN
+    bot.BOT_API_URL = f"http://127.0.0.1:{port}"
+    kinds: Dict[int, str] = {}
+    processor = TimedProcessor(args.concurrency, api, kinds)
+    processor.expected = args.updates
+    app = bot.build_application(processor=processor)
+
+    await app.initialize()
+    await bot.post_init(app)
+    await app.updater.start_polling(poll_interval=0, timeout=1)
+    await app.start()
+
+    started = time.perf_counter()
+    for i in range(args.updates):
+        kind, upd = stream.next()
+        kinds[upd["update_id"]] = kind
+        api.push(upd)
+        if args.rate:
+            # Bir tekis oqim; rate=0 — hammasi bir zumda (burst)
+            delay = started + (i + 1) / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    try:
+        await asyncio.wait_for(processor.all_done.wait(), args.deadline)
+    except asyncio.TimeoutError:
+        print(f"⚠️  {args.deadline}s ichida {processor.done}/{args.updates} update qayta ishlandi")
+    elapsed = time.perf_counter() - started
+
+    await app.updater.stop()
+    await app.stop()
+    await bot.post_stop(app)
+    await app.shutdown()
+    await bot.post_shutdown(app)
+    server.close()
+
+    report(args, processor, api, elapsed)
+
+def report(args: argparse.Namespace, processor: TimedProcessor, api: FakeBotApi, elapsed: float) -> None:
+    print(
+        f"\nupdates={processor.done}/{args.updates} concurrency={args.concurrency} rate={args.rate or 'burst'} "
+        f"latency={args.latency_ms}±{args.jitter_ms}ms p429={args.p429}"
+    )
+    print(f"throughput: {processor.done / elapsed:.1f} upd/s ({elapsed:.2f}s)\n")
+    print(f"{'handler':<22}{'n':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind in sorted(processor.samples):
+        values = processor.samples[kind]
+        print(
+            f"{kind:<22}{len(values):>7}{percentile(values, 0.5) * 1000:>10.1f}"
+            f"{percentile(values, 0.99) * 1000:>10.1f}{max(values) * 1000:>10.1f}"
+        )
+    print("\nAPI calls:", dict(sorted(api.calls.items())))
+    print("429 injected:", dict(api.throttled), "| 403 (unstarted):", api.forbidden)
+    print("outbound:", bot.OUTBOUND.stats)
+    print("group bursts:", bot.GROUP_PIPELINE.stats)
+
+# ----------------- STARTUP -----------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORT_PROBE = "import time; t = time.perf_counter(); import bot; print(time.perf_counter() - t)"
+
+def start_update(update_id: int = 1, uid: int = 700_001) -> Dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 1, "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": "Cold", "language_code": "uz"},
+            "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def child_env(api_port: int, **extra: str) -> Dict[str, str]:
+    tmp = tempfile.mkdtemp(prefix="umra_startup_")
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": TOKEN, "BOT_API_URL": f"http://127.0.0.1:{api_port}", "WEBHOOK_URL": "", "BOT_WORKERS": "1",
+        "STATE_DB": os.path.join(tmp, "state.sqlite3"), "POPULARITY_FILE": os.path.join(tmp, "popularity.json"),
+    })
+    env.update(extra)
+    return env
+
+async def wait_for(predicate, deadline: float) -> None:
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.002)
+
+async def measure_import() -> float:
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", IMPORT_PROBE, cwd=HERE, env=child_env(0), stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    out, _ = await proc.communicate()
+    return float(out.decode().strip())
+
+async def measure_webhook_once(api: FakeBotApi, api_port: int) -> Dict[str, float]:
+    # Jarayon ishga tushadi -> port ochiladi -> POST /start -> birinchi sendMessage -> chiqish
+    port = free_port()
+    api.first_call.clear()
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(HERE, "webhook_once.py"), cwd=HERE,
+        env=child_env(api_port, PORT=str(port), WEBHOOK_LISTEN="127.0.0.1", WEBHOOK_SECRET="loadtest"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            break
+        except OSError:
+            if time.perf_counter() - started > 30:
+                raise
+            await asyncio.sleep(0.002)
+    listening = time.perf_counter()
+
+    body = json.dumps(start_update()).encode()
+    writer.write(
+        f"POST /telegram HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: loadtest\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = (await reader.readline()).decode().split(" ")[1]
+    answered = time.perf_counter()
+    writer.close()
+    code = await proc.wait()
+    exited = time.perf_counter()
+    if status != "200" or code != 0 or "sendMessage" not in api.first_call:
+        raise RuntimeError(f"webhook_once: HTTP {status}, exit {code}")
+    return {
+        "listen_ms": (listening - started) * 1000,
+        "first_response_ms": (api.first_call["sendMessage"] - started) * 1000,
+        "http_200_ms": (answered - started) * 1000,
+        "exit_ms": (exited - started) * 1000,
+    }
+
+async def measure_polling(api: FakeBotApi, api_port: int) -> Dict[str, float]:
+    # Oddiy `python bot.py`: update oldindan navbatda turadi, birinchi sendMessage'gacha
+    api.first_call.clear()
+    api.updates.clear()
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(HERE, "bot.py"), cwd=HERE, env=child_env(api_port),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    api.push(start_update(update_id=len(api.released) + 1))
+    try:
+        await wait_for(lambda: "sendMessage" in api.first_call, started + 30)
+    finally:
+        proc.terminate()
+        await proc.wait()
+    return {"first_response_ms": (api.first_call["sendMessage"] - started) * 1000}
+
+def median(values: List[float]) -> float:
+    return percentile(values, 0.5)
+
+def release_label() -> str:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+async def startup(args: argparse.Namespace) -> None:
+    api = FakeBotApi(args.latency_ms, 0, 0.0, 1, random.Random(args.seed))
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    api_port = server.sockets[0].getsockname()[1]
+
+    samples: Dict[str, List[float]] = {}
+    for _ in range(args.runs):
+        samples.setdefault("import_bot_ms", []).append(await measure_import() * 1000)
+        for name, value in (await measure_webhook_once(api, api_port)).items():
+            samples.setdefault(f"webhook_once.{name}", []).append(value)
+        for name, value in (await measure_polling(api, api_port)).items():
+            samples.setdefault(f"polling.{name}", []).append(value)
+    server.close()
+
+    print(f"\nstartup runs={args.runs} api latency={args.latency_ms}ms\n")
+    print(f"{'metric':<34}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, values in samples.items():
+        print(f"{name:<34}{median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+    if args.out:
+        record = {
+            "release": args.label or release_label(), "time": int(time.time()),
+            "python": sys.version.split()[0], "runs": args.runs,
+            **{name: round(median(values), 1) for name, values in samples.items()},
+        }
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\n-> {args.out}")
+
+def parse_startup_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — sovuq start o'lchovi")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--latency-ms", type=float, default=30)
+    p.add_argument("--out", help="natijani JSON qator qilib qo'shish (masalan startup.jsonl)")
+    p.add_argument("--label", help="release nomi; standart — git describe")
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+# ----------------- REPLAY -----------------
+def deep_link_update(update_id: int, uid: int, key: str) -> Dict[str, Any]:
+    upd = start_update(update_id, uid)
+    upd["message"]["text"] = f"/start faq_{key}"
+    return upd
+
+def peak_rate(stamps: List[float], window: float = 1.0) -> int:
+    peak = lo = 0
+    for hi, stamp in enumerate(stamps):
+        while stamp - stamps[lo] > window:
+            lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+async def replay(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    api = FakeBotApi(args.latency_ms, args.jitter_ms, 0.0, 1, rng)
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    api_port = server.sockets[0].getsockname()[1]
+
+    # Har bir update alohida foydalanuvchidan — javob (sendMessage) qaysi update'ga tegishli ekani aniq
+    users = [800_000 + i for i in range(args.updates)]
+    for i, uid in enumerate(users):
+        api.push(deep_link_update(i + 1, uid, rng.choice(bot.CONTENT.top_keys)))
+
+    env = child_env(
+        api_port, BACKLOG_RATE=str(args.backlog_rate), DRAIN_SECONDS=str(args.drain), BOT_WORKERS=str(args.workers),
+    )
+    log_path = os.path.join(os.path.dirname(env["STATE_DB"]), "bot.log")
+    kills: Counter = Counter()
+    answered = lambda: sum(1 for uid in users if api.sent_to[uid])  # noqa: E731
+    started = time.perf_counter()
+
+    with open(log_path, "ab") as bot_log:
+        for _ in range(args.max_rounds):
+            polls = api.calls["getUpdates"]
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(HERE, "bot.py"), cwd=HERE, env=env, stdout=bot_log, stderr=bot_log,
+            )
+            try:
+                # O'ldirish vaqti polling boshlanganidan sanaladi — worker'larning ishga tushishi
+                # (spawn + import) bir necha soniya, usiz raundlar hech narsa qilmay tugaydi
+                await wait_for(lambda: api.calls["getUpdates"] > polls or proc.returncode is not None,
+                               time.perf_counter() + 60)
+                await wait_for(lambda: answered() == len(users), time.perf_counter() + rng.uniform(args.min_kill, args.max_kill))
+                finished = True
+            except TimeoutError:
+                finished = False
+            sig = signal.SIGKILL if not finished and rng.random() < args.p_sigkill else signal.SIGTERM
+            kills[sig.name] += 1
+            proc.send_signal(sig)
+            await proc.wait()
+            if finished:
+                break
+    elapsed = time.perf_counter() - started
+    server.close()
+
+    lost = [uid for uid in users if not api.sent_to[uid]]
+    duplicates = sum(api.sent_to[uid] - 1 for uid in users if api.sent_to[uid] > 1)
+    print(f"\nreplay updates={args.updates} rounds={sum(kills.values())} kills={dict(kills)} ({elapsed:.1f}s)")
+    print(f"javob olgan: {len(users) - len(lost)}/{len(users)} | yo'qolgan: {len(lost)} | takroriy javob: {duplicates}")
+    print(f"sendMessage cho'qqisi: {peak_rate(api.sent_at)}/s (BACKLOG_RATE={args.backlog_rate})")
+    print(f"bot log: {log_path}")
+    if lost:
+        sys.exit(1)
+
+def parse_replay_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — restart/kill paytida update yo'qolmasligi sinovi")
+    p.add_argument("--updates", type=int, default=200)
+    p.add_argument("--backlog-rate", type=float, default=20)
+    p.add_argument("--drain", type=float, default=8)
+    p.add_argument("--min-kill", type=float, default=1.0, help="polling boshlangandan o'ldirishgacha, s")
+    p.add_argument("--max-kill", type=float, default=4.0)
+    p.add_argument("--p-sigkill", type=float, default=0.3, help="SIGTERM o'rniga SIGKILL ehtimoli")
+    p.add_argument("--max-rounds", type=int, default=60)
+    p.add_argument("--workers", type=int, default=1, help="BOT_WORKERS (sharded rejim)")
+    p.add_argument("--latency-ms", type=float, default=30)
+    p.add_argument("--jitter-ms", type=float, default=20)
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+# ----------------- WEBHOOK -----------------
+async def post_update(port: int, path: str, update: Dict[str, Any], secret: Optional[str]) -> Tuple[int, float]:
+    # Telegram'ning webhook so'rovi: secret=None — sarlavhasiz
+    body = json.dumps(update).encode()
+    head = f"POST /{path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nConnection: close\r\n"
+    if secret is not None:
+        head += f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"{head}Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split(b" ")[1])
+    finally:
+        writer.close()
+    return status, time.perf_counter() - started
+
+async def wait_listening(port: int, deadline: float) -> None:
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.01)
+            continue
+        writer.close()
+        return
+
+def recorded_updates(path: Optional[str], n: int, users: int, seed: int) -> List[Dict[str, Any]]:
+    # Yozib olingan update'lar (JSON qatorlar); fayl yo'q bo'lsa — generatsiya qilinib shu faylga yoziladi
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    stream = UpdateStream(users, random.Random(seed))
+    updates = [stream.next()[1] for _ in range(n)]
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(u, ensure_ascii=False) + "\n" for u in updates)
+    return updates
+
+def expected_effects(updates: List[Dict[str, Any]]) -> Tuple[Set[str], Set[int], Counter]:
+    # Har bir update'dan keyin soxta API'da nima ko'rinishi kerak: tugma/inline javobi,
+    # guruhdan o'chirish, deep-link javobi (topic tashqarisidagi xabarlar — hech narsa)
+    callbacks: Set[str] = set()
+    deletes: Set[int] = set()
+    deep_links: Counter = Counter()
+    for upd in updates:
+        if "callback_query" in upd:
+            callbacks.add(upd["callback_query"]["id"])
+            continue
+        if "inline_query" in upd:
+            callbacks.add(upd["inline_query"]["id"])
+            continue
+        msg = upd["message"]
+        if msg["chat"]["type"] == "private":
+            deep_links[msg["chat"]["id"]] += 1
+        elif msg.get("message_thread_id") == bot.ONLY_TOPIC_ID:
+            deletes.add(msg["message_id"])
+    return callbacks, deletes, deep_links
+
+def effects_done(api: FakeBotApi, callbacks: Set[str], deletes: Set[int], deep_links: Counter) -> Tuple[int, int, int]:
+    return (
+        len(callbacks & api.answered),
+        len(deletes & api.deleted),
+        sum(min(api.sent_to[uid], n) for uid, n in deep_links.items()),
+    )
+
+async def webhook(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    api = FakeBotApi(args.latency_ms, args.jitter_ms, 0.0, 1, rng)
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    api_port = server.sockets[0].getsockname()[1]
+    updates = recorded_updates(args.file, args.updates, args.users, args.seed)
+    callbacks, deletes, deep_links = expected_effects(updates)
+
+    # `python bot.py` o'zgarmagan holda — WEBHOOK_URL berilgani uchun run_webhook ishlaydi
+    port = free_port()
+    env = child_env(
+        api_port, WEBHOOK_URL=f"http://127.0.0.1:{port}", WEBHOOK_LISTEN="127.0.0.1", PORT=str(port),
+        WEBHOOK_PATH="telegram", WEBHOOK_SECRET=args.secret, ALLOWED_CHAT_ID="", ROUTES_FILE="",
+        CONCURRENT_UPDATES=str(args.concurrency), BOT_WORKERS=str(args.workers),
+    )
+    log_path = os.path.join(os.path.dirname(env["STATE_DB"]), "bot.log")
+    with open(log_path, "ab") as bot_log:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(HERE, "bot.py"), cwd=HERE, env=env, stdout=bot_log, stderr=bot_log,
+        )
+    try:
+        # Telegram kabi: secret setWebhook'dan olinadi
+        await wait_for(lambda: api.webhook or proc.returncode is not None, time.perf_counter() + 30)
+        secret = api.webhook.get("secret_token")
+        if not secret:
+            raise RuntimeError(f"setWebhook secret_token'siz chaqirildi (log: {log_path})")
+        # PTB avval setWebhook qiladi, keyin portni ochadi
+        await wait_listening(port, time.perf_counter() + 30)
+        # Sharded rejimda worker'larning ishga tushish getMe'lari quyidagi hisobga tushmasin
+        await wait_for(lambda: api.calls["getMe"] >= args.workers + (args.workers > 1), time.perf_counter() + 60)
+
+        # Secret'siz va noto'g'ri secret bilan — 403, bot hech narsa qilmasligi kerak
+        calls_before = sum(api.calls.values())
+        rejected: Counter = Counter()
+        for upd in updates[:args.unauthorized]:
+            for bad in (None, f"x{secret}"):
+                status, _ = await post_update(port, "telegram", upd, bad)
+                rejected[status] += 1
+        await asyncio.sleep(bot.BURST_WINDOW_SECONDS + 0.5)
+        leaked = sum(api.calls.values()) - calls_before
+
+        statuses: Counter = Counter()
+        http: List[float] = []
+        started = time.perf_counter()
+        for i, upd in enumerate(updates):
+            status, elapsed = await post_update(port, "telegram", upd, secret)
+            statuses[status] += 1
+            http.append(elapsed)
+            if args.rate:
+                delay = started + (i + 1) / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        def handled() -> Tuple[int, int, int]:
+            return effects_done(api, callbacks, deletes, deep_links)
+
+        expected = (len(callbacks), len(deletes), sum(deep_links.values()))
+        try:
+            await wait_for(lambda: handled() == expected, time.perf_counter() + args.deadline)
+        except TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        await proc.wait()
+        server.close()
+
+    got = handled()
+    print(f"\nwebhook updates={len(updates)} secret={'berilgan' if args.secret else 'yaratilgan'} "
+          f"concurrency={args.concurrency} workers={args.workers}")
+    print(f"secret'siz/noto'g'ri: {dict(rejected)} | shundan keyingi API chaqiruvlari: {leaked}")
+    print(f"HTTP: {dict(statuses)} | javob p50 {percentile(http, 0.5) * 1000:.1f} ms, p99 {percentile(http, 0.99) * 1000:.1f} ms")
+    print(f"qayta ishlandi ({elapsed:.2f}s): tugmalar {got[0]}/{expected[0]}, guruhdan o'chirildi {got[1]}/{expected[1]}, "
+          f"deep-link javoblari {got[2]}/{expected[2]}")
+    print(f"bot log: {log_path}")
+    if set(rejected) != {403} or leaked or set(statuses) != {200} or got != expected:
+        sys.exit(1)
+
+def parse_webhook_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — webhook rejimi: yozib olingan update'larni POST qilish")
+    p.add_argument("--file", help="update'lar (JSON qatorlar); yo'q bo'lsa generatsiya qilinib shu yerga yoziladi")
+    p.add_argument("--updates", type=int, default=300)
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--secret", default="", help="WEBHOOK_SECRET; bo'sh — bot o'zi yaratadi")
+    p.add_argument("--unauthorized", type=int, default=20, help="secret'siz yuboriladigan update'lar soni")
+    p.add_argument("--rate", type=float, default=0, help="POST/s; 0 — ketma-ket, kutmasdan")
+    p.add_argument("--concurrency", type=int, default=4, help="CONCURRENT_UPDATES")
+    p.add_argument("--workers", type=int, default=1, help="BOT_WORKERS")
+    p.add_argument("--latency-ms", type=float, default=30)
+    p.add_argument("--jitter-ms", type=float, default=20)
+    p.add_argument("--deadline", type=float, default=60)
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+# ----------------- WORKERS -----------------
+# Xabar yuborish va edit'lar umumiy 30/s limitiga kiradi (worker'lar orasida bo'linadi), shuning
+# uchun standart aralashma limitga kirmaydigan update'lardan: inline so'rovlar — qabul qiluvchi
+# va worker'larning qayta ishlash quvvati o'lchanadi. --kinds bilan haqiqiy aralashma ham mumkin.
+def parse_kinds(spec: str) -> Tuple[Tuple[str, int], ...]:
+    kinds = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        kinds.append((name.strip(), int(weight or 1)))
+    return tuple(kinds)
+
+async def workers_round(api: FakeBotApi, api_port: int, workers: int, args: argparse.Namespace) -> Dict[str, float]:
+    stream = UpdateStream(args.users, random.Random(args.seed), parse_kinds(args.kinds))
+    updates = [stream.next()[1] for _ in range(args.updates)]
+    callbacks, deletes, deep_links = expected_effects(updates)
+    expected = (len(callbacks), len(deletes), sum(deep_links.values()))
+    api.updates.clear()
+    api.calls.clear()
+    for seen in (api.answered, api.deleted, api.sent_to):
+        seen.clear()
+
+    env = child_env(
+        api_port, BOT_WORKERS=str(workers), CONCURRENT_UPDATES=str(args.concurrency), BACKLOG_RATE="100000",
+        ALLOWED_CHAT_ID="", ROUTES_FILE="",
+    )
+    log_path = os.path.join(os.path.dirname(env["STATE_DB"]), "bot.log")
+    with open(log_path, "ab") as bot_log:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(HERE, "bot.py"), cwd=HERE, env=env, stdout=bot_log, stderr=bot_log,
+        )
+    try:
+        # Qabul qiluvchi va har bir worker getMe qiladi; bo'sh getUpdates — restart navbati tugadi
+        await wait_for(lambda: api.calls["getMe"] >= workers + (workers > 1) and api.calls["getUpdates"] >= 2,
+                       time.perf_counter() + 60)
+        started = time.perf_counter()
+        for upd in updates:
+            api.push(upd)
+        try:
+            await wait_for(lambda: effects_done(api, callbacks, deletes, deep_links) == expected,
+                           started + args.deadline)
+        except TimeoutError:
+            print(f"⚠️  workers={workers}: {args.deadline}s ichida tugamadi (log: {log_path})")
+        elapsed = time.perf_counter() - started
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        await proc.wait()
+    done = sum(effects_done(api, callbacks, deletes, deep_links))
+    return {"done": done, "expected": sum(expected), "seconds": elapsed, "rate": len(updates) / elapsed}
+
+async def workers_bench(args: argparse.Namespace) -> None:
+    api = FakeBotApi(args.latency_ms, args.jitter_ms, 0.0, 1, random.Random(args.seed))
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    api_port = server.sockets[0].getsockname()[1]
+
+    rows = [(n, await workers_round(api, api_port, n, args)) for n in args.workers]
+    server.close()
+
+    print(f"\nworkers updates={args.updates} kinds={args.kinds} concurrency={args.concurrency} "
+          f"latency={args.latency_ms}±{args.jitter_ms}ms cpu={os.cpu_count()}\n")
+    print(f"{'workers':<10}{'upd/s':>10}{'s':>8}{'x':>7}{'tugadi':>12}")
+    base = rows[0][1]["rate"]
+    for n, row in rows:
+        print(f"{n:<10}{row['rate']:>10.1f}{row['seconds']:>8.2f}{row['rate'] / base:>7.2f}"
+              f"{row['done']:>7}/{row['expected']}")
+
+def parse_workers_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — BOT_WORKERS soni bo'yicha o'tkazuvchanlik")
+    p.add_argument("--workers", type=lambda v: [int(x) for x in v.split(",")], default=[1, 2, 4],
+                   help="vergul bilan, masalan 1,2,4")
+    p.add_argument("--updates", type=int, default=2000)
+    p.add_argument("--kinds", default="inline=1", help="masalan inline=70,tap=20,group_topic=10")
+    p.add_argument("--users", type=int, default=500)
+    p.add_argument("--concurrency", type=int, default=16, help="har bir worker'da CONCURRENT_UPDATES")
+    p.add_argument("--latency-ms", type=float, default=30)
+    p.add_argument("--jitter-ms", type=float, default=20)
+    p.add_argument("--deadline", type=float, default=120)
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+# ----------------- FUZZ -----------------
+def fuzz_payload(rng: random.Random, valid: List[str]) -> str:
+    kind = rng.random()
+    if kind < 0.3:
+        return "".join(chr(rng.randrange(0x20, 0x7F)) for _ in range(rng.randrange(0, 65)))
+    if kind < 0.5:
+        raw = bytes(rng.randrange(256) for _ in range(rng.randrange(0, 48)))
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    if kind < 0.75:
+        # Haqiqiy tugmaning bitta bayti buzilgan, qisqartirilgan yoki uzaytirilgan
+        raw = bytearray(base64.urlsafe_b64decode(rng.choice(valid) + "=="))
+        mutation = rng.randrange(3)
+        if mutation == 0:
+            raw[rng.randrange(len(raw))] = rng.randrange(256)
+        elif mutation == 1:
+            del raw[rng.randrange(len(raw)):]
+        else:
+            raw += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 8)))
+        return base64.urlsafe_b64encode(bytes(raw)).decode().rstrip("=")
+    if kind < 0.9:
+        # Eski ":" formatiga o'xshash satrlar
+        verb = rng.choice(("page", "lang", "faq", "back", "", "x"))
+        pieces = ("", "uz", "kr", "0", "-1", "9" * rng.randrange(1, 40), "a:b", "💧")
+        parts = [rng.choice(pieces) for _ in range(rng.randrange(0, 5))]
+        return ":".join([verb, *parts])
+    return "".join(chr(rng.randrange(0, 0x3000)) for _ in range(rng.randrange(0, 30)))
+
+def fuzz(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    valid = sorted({
+        button.callback_data
+        for markup in [*bot.RENDER.menus.values(), *bot.RENDER.answer_kbs.values()]
+        for row in markup.inline_keyboard for button in row
+    })
+    tree = bot.RENDER.tree
+    for data in valid:
+        cb = bot.decode_callback(data, tree)
+        assert cb is not None, data
+        again = bot.encode_callback(tree, cb.op, cb.lang, cb.page, cb.faq)
+        assert again == data, (data, again)
+    for lang in ("", "ru", "UZ"):
+        try:
+            bot.encode_callback(tree, bot.OP_PAGE, lang, 0)
+        except ValueError:
+            continue
+        raise AssertionError(f"encode_callback noma'lum tilni qabul qildi: {lang!r}")
+    # Boshqa joylashuvdagi daraxt (pack yangilangandek) — eski tugmalarning hammasi eskirgan
+    other = bot.MenuTree(bot.CONTENT, per_page=2)
+    assert other.stamp != tree.stamp
+    for data in valid:
+        cb = bot.decode_callback(data, other)
+        assert cb is not None and cb.stale, data
+
+    decoded = Counter()
+    started = time.perf_counter()
+    for _ in range(args.cases):
+        data = fuzz_payload(rng, valid)
+        try:
+            cb = bot.decode_callback(data, tree)
+        except Exception as e:
+            raise AssertionError(f"decode_callback({data!r}) -> {e!r}") from e
+        decoded["rejected" if cb is None else "stale" if cb.stale else bot.CALLBACK_OPS[cb.op]] += 1
+    elapsed = time.perf_counter() - started
+    print(f"round-trip: {len(valid)} tugma | fuzz: {args.cases} payload, {elapsed / args.cases * 1e6:.1f} µs/payload")
+    print("natija:", dict(decoded.most_common()))
+
+def parse_fuzz_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — callback_data dekoderi fuzz")
+    p.add_argument("--cases", type=int, default=200_000)
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+# ----------------- MATCH -----------------
+# match_corpus.jsonl — guruhlarda haqiqatda yoziladigan savollar va kutilgan FAQ kaliti
+# (key: null — javob berilmasligi kerak bo'lgan xabarlar: salom, taksi, bilet...).
+MATCH_CORPUS = os.path.join(HERE, "match_corpus.jsonl")
+
+def match(args: argparse.Namespace) -> None:
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    started = time.perf_counter()
+    matcher = bot.FaqMatcher(bot.CONTENT)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    results: Counter = Counter()
+    failures: List[Tuple[str, Optional[str], Optional[str]]] = []
+    for case in corpus:
+        got, want = matcher.match(case["text"]), case["key"]
+        if want is None:
+            outcome = "to‘g‘ri_jim" if got is None else "keraksiz_javob"
+        elif got == want:
+            outcome = "to‘g‘ri"
+        else:
+            outcome = "topilmadi" if got is None else "noto‘g‘ri"
+        results[outcome] += 1
+        if outcome not in ("to‘g‘ri", "to‘g‘ri_jim"):
+            failures.append((case["text"], want, got))
+
+    # Kechikish: har bir xabar --rounds marta, alohida o'lchanadi
+    clock = time.perf_counter
+    samples: List[float] = []
+    for _ in range(args.rounds):
+        for case in corpus:
+            t = clock()
+            matcher.match(case["text"])
+            samples.append(clock() - t)
+
+    positives = sum(1 for c in corpus if c["key"] is not None)
+    negatives = len(corpus) - positives
+    print(f"\nmatch corpus={len(corpus)} ({positives} savol, {negatives} begona) content={bot.CONTENT.source} "
+          f"indeks: {build_ms:.1f} ms")
+    print(f"aniqlik: {results['to‘g‘ri']}/{positives} ({results['to‘g‘ri'] / max(1, positives):.0%}) | "
+          f"noto‘g‘ri javob: {results['noto‘g‘ri']} | topilmadi: {results['topilmadi']} | "
+          f"begonaga javob: {results['keraksiz_javob']}/{negatives}")
+    print(f"bitta xabar: p50 {percentile(samples, 0.5) * 1e6:.1f} µs, p99 {percentile(samples, 0.99) * 1e6:.1f} µs, "
+          f"max {max(samples) * 1e6:.1f} µs")
+    for text, want, got in failures:
+        print(f"  ✗ {text!r}: kutilgan {want}, chiqdi {got}")
+    # Precision — bot yuborgan javoblardan to'g'rilari (noto'g'ri FAQ ham, begonaga javob ham xato)
+    answered = results["to‘g‘ri"] + results["noto‘g‘ri"] + results["keraksiz_javob"]
+    precision = results["to‘g‘ri"] / answered if answered else 1.0
+    print(f"precision: {results['to‘g‘ri']}/{answered} ({precision:.1%}), chegara {args.min_precision:.0%}")
+    if precision < args.min_precision:
+        sys.exit(1)
+
+def parse_match_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — guruh savollari matcher'i: aniqlik va kechikish")
+    p.add_argument("--corpus", default=MATCH_CORPUS, help="JSON qatorlar: {\"text\": ..., \"key\": ... yoki null}")
+    p.add_argument("--rounds", type=int, default=200)
+    p.add_argument("--min-precision", type=float, default=0.95, help="bundan past bo'lsa chiqish kodi 1")
+    return p.parse_args(argv)
+
+# ----------------- TAPS -----------------
+# Eski yo'l — har bosishda menyu qayta quriladi, sarlavha butun matndan kesiladi, promo
+# qo'shiladi (RenderCache'dan oldingi callback_handler). API chaqiruvlari o'lchovga kirmaydi.
+TAP_OPS = (("faq", 50), ("page", 20), ("back", 20), ("lang", 10))
+
+def naive_title(key: str, lang: str) -> str:
+    return bot.CONTENT.text(key, lang).strip().split("\n", 1)[0].strip()
+
+def naive_menu(page: int, lang: str) -> Any:
+    keys = bot.CONTENT.top_keys
+    per_page = bot.ITEMS_PER_PAGE
+    pages = max(1, -(-len(keys) // per_page))
+    page = max(0, min(pages - 1, page))
+    rows = [
+        [bot.InlineKeyboardButton(naive_title(k, lang), callback_data=f"faq:{k}:{lang}:{page}")]
+        for k in keys[page * per_page:(page + 1) * per_page]
+    ]
+    nav = []
+    if page > 0:
+        nav.append(bot.InlineKeyboardButton("⬅️", callback_data=f"page:{page - 1}:{lang}"))
+    if page < pages - 1:
+        nav.append(bot.InlineKeyboardButton("➡️", callback_data=f"page:{page + 1}:{lang}"))
+    if nav:
+        rows.append(nav)
+    rows.append([
+        bot.InlineKeyboardButton("UZB", callback_data=f"lang:uz:{page}"),
+        bot.InlineKeyboardButton("КРИЛ", callback_data=f"lang:kr:{page}"),
+    ])
+    return bot.InlineKeyboardMarkup(rows)
+
+def naive_tap(data: str) -> Tuple[Optional[str], Any]:
+    verb, _, rest = data.strip().partition(":")
+    if verb == "page":
+        page_s, lang = rest.split(":")
+        return None, naive_menu(int(page_s), lang)
+    if verb == "lang":
+        lang, page_s = rest.split(":")
+        return None, naive_menu(int(page_s), lang)
+    if verb == "faq":
+        key, lang, page_s = rest.split(":")
+        text = bot.CONTENT.text(key, lang).strip()
+        if key in bot.CONTENT.promo_keys:
+            text += bot.promo_block(lang)
+        return text, bot.InlineKeyboardMarkup(
+            [[bot.InlineKeyboardButton("⬅️ Orqaga", callback_data=f"back:{lang}:{page_s}")]]
+        )
+    lang, page_s = rest.split(":")
+    return bot.start_text(lang), naive_menu(int(page_s), lang)
+
+def cached_tap(data: str) -> Tuple[Optional[str], Any]:
+    render = bot.RENDER
+    cb = bot.decode_callback(data.strip(), render.tree)
+    if cb.op == bot.OP_FAQ:
+        return render.answer(render.tree.faq_key(cb.faq), cb.lang), render.answer_kb(cb.lang, cb.page)
+    if cb.op == bot.OP_BACK:
+        return render.start(cb.lang), render.menu(cb.page, cb.lang)
+    return None, render.menu(cb.page, cb.lang)
+
+def tap_pairs(rng: random.Random, n: int) -> List[Tuple[str, str, str]]:
+    # Bir xil bosishlar ketma-ketligi ikki formatda: (amal, eski callback_data, yangi callback_data)
+    content, tree = bot.CONTENT, bot.RENDER.tree
+    flat_pages = max(1, -(-len(content.top_keys) // bot.ITEMS_PER_PAGE))
+    ops, weights = zip(*TAP_OPS)
+    pairs = []
+    for _ in range(n):
+        op = rng.choices(ops, weights)[0]
+        lang = rng.choice(content.langs)
+        if op == "faq":
+            key = rng.choice(content.top_keys)
+            pairs.append((op, f"faq:{key}:{lang}:0", bot.encode_callback(tree, bot.OP_FAQ, lang, 0, tree.faq_ids[key])))
+            continue
+        page = rng.randrange(flat_pages)
+        screen = rng.randrange(len(tree.screens))
+        if op == "page":
+            pairs.append((op, f"page:{page}:{lang}", bot.encode_callback(tree, bot.OP_PAGE, lang, screen)))
+        elif op == "lang":
+            pairs.append((op, f"lang:{lang}:{page}", bot.encode_callback(tree, bot.OP_LANG, lang, screen)))
+        else:
+            pairs.append((op, f"back:{lang}:{page}", bot.encode_callback(tree, bot.OP_BACK, lang, screen)))
+    return pairs
+
+def time_taps(render_tap, payloads: List[Tuple[str, str]]) -> Dict[str, List[float]]:
+    samples: Dict[str, List[float]] = {}
+    clock = time.perf_counter
+    for op, data in payloads:
+        t = clock()
+        render_tap(data)
+        samples.setdefault(op, []).append(clock() - t)
+    return samples
+
+def taps(args: argparse.Namespace) -> None:
+    pairs = tap_pairs(random.Random(args.seed), args.taps)
+    # Isinish: birinchi o'tishdagi keshlanmagan javoblar o'lchovga kirmasin
+    time_taps(cached_tap, [(op, new) for op, _, new in pairs[:1000]])
+    before = time_taps(naive_tap, [(op, old) for op, old, _ in pairs])
+    after = time_taps(cached_tap, [(op, new) for op, _, new in pairs])
+
+    print(f"\ntaps={args.taps} (faq/page/back/lang = {'/'.join(str(w) for _, w in TAP_OPS)}) content={bot.CONTENT.source}\n")
+    print("{:<8}{:>8}{:>15}{:>15}{:>15}{:>15}{:>8}".format(
+        "amal", "n", "oldin p50 µs", "hozir p50 µs", "oldin o‘rta µs", "hozir o‘rta µs", "x"))
+    for op in [*sorted(before), "hammasi"]:
+        old = before[op] if op in before else [v for vs in before.values() for v in vs]
+        new = after[op] if op in after else [v for vs in after.values() for v in vs]
+        old_mean, new_mean = sum(old) / len(old), sum(new) / len(new)
+        print(
+            f"{op:<8}{len(old):>8}{median(old) * 1e6:>15.2f}{median(new) * 1e6:>15.2f}"
+            f"{old_mean * 1e6:>15.2f}{new_mean * 1e6:>15.2f}{old_mean / new_mean:>8.1f}"
+        )
+
+def parse_taps_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — bitta tugma bosishining lokal narxi (oldin/hozir)")
+    p.add_argument("--taps", type=int, default=50_000)
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Umra FAQ bot — soxta Bot API bilan yuklama sinovi")
+    p.add_argument("--updates", type=int, default=1000)
+    p.add_argument("--rate", type=float, default=0, help="update/s; 0 — burst")
+    p.add_argument("--users", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--latency-ms", type=float, default=30)
+    p.add_argument("--jitter-ms", type=float, default=20)
+    p.add_argument("--p429", type=float, default=0.0)
+    p.add_argument("--retry-after", type=int, default=1)
+    p.add_argument("--groups-only", action="store_true", help="faqat guruh topic xabarlari (burst)")
+    p.add_argument("--unstarted", type=float, default=0.0, help="botni ishga tushirmagan foydalanuvchilar ulushi")
+    p.add_argument("--deadline", type=float, default=300)
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["startup"]:
+        asyncio.run(startup(parse_startup_args(sys.argv[2:])))
+    elif sys.argv[1:2] == ["fuzz"]:
+        fuzz(parse_fuzz_args(sys.argv[2:]))
+    elif sys.argv[1:2] == ["replay"]:
+        asyncio.run(replay(parse_replay_args(sys.argv[2:])))
+    elif sys.argv[1:2] == ["webhook"]:
+        asyncio.run(webhook(parse_webhook_args(sys.argv[2:])))
+    elif sys.argv[1:2] == ["match"]:
+        match(parse_match_args(sys.argv[2:]))
+    elif sys.argv[1:2] == ["workers"]:
+        asyncio.run(workers_bench(parse_workers_args(sys.argv[2:])))
+    elif sys.argv[1:2] == ["taps"]:
+        taps(parse_taps_args(sys.argv[2:]))
+    else:
+        asyncio.run(run(parse_args(sys.argv[1:])))
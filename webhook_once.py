@@ -0,0 +1,121 @@
+# webhook_once.py
+# Scale-to-zero rejimi: bitta webhook so'rovini qayta ishlab, jarayon chiqadi.
+#
+#   PORT=8080 WEBHOOK_PATH=telegram WEBHOOK_SECRET=... python webhook_once.py
+#
+# Bu fayl faqat standart kutubxonani import qiladi — port darhol ochiladi, og'ir importlar
+# (telegram, httpx, bot) esa shu paytda fon oqimida yuklanadi. Javob update to'liq qayta
+# ishlangandan keyin qaytadi: xato bo'lsa 500, Telegram update'ni keyinroq qayta yuboradi.
+# Webhook'ni o'rnatish (setWebhook) bir marta, oddiy `python bot.py` rejimida qilinadi.
+# WEBHOOK_SECRET majburiy — aynan shu secret setWebhook'da ham berilgan bo'lishi kerak.
+
+import os
+import sys
+import hmac
+import json
+import asyncio
+import importlib
+import logging
+from typing import Dict, Optional, Tuple
+
+WEBHOOK_PATH = (os.getenv("WEBHOOK_PATH") or "telegram").strip().strip("/")
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET") or "").strip()
+WEBHOOK_LISTEN = (os.getenv("WEBHOOK_LISTEN") or "0.0.0.0").strip()
+PORT_RAW = (os.getenv("PORT") or "").strip()
+PORT = int(PORT_RAW) if PORT_RAW.isdigit() else 8080
+
+# Shuncha vaqt ichida so'rov kelmasa — jarayon baribir chiqadi
+IDLE_SECONDS_RAW = (os.getenv("ONCE_IDLE_SECONDS") or "").strip()
+IDLE_SECONDS = float(IDLE_SECONDS_RAW) if IDLE_SECONDS_RAW.replace(".", "", 1).isdigit() else 60.0
+
+STATUS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 500: "Internal Server Error",
+          503: "Service Unavailable"}
+
+log = logging.getLogger("umra_faq_bot")
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    body = await asyncio.wait_for(reader.readexactly(int(headers.get("content-length") or 0)), timeout=10)
+    return method, path, headers, body
+
+async def serve_once() -> int:
+    loop = asyncio.get_running_loop()
+    # Import port ochilishi bilan parallel boshlanadi
+    bot_module = loop.run_in_executor(None, importlib.import_module, "bot")
+    done: asyncio.Future = loop.create_future()
+    busy = False
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal busy
+        status = 500
+        result: Optional[int] = None
+        try:
+            method, path, headers, body = await read_request(reader)
+            secret = headers.get("x-telegram-bot-api-secret-token", "")
+            if method != "POST" or path.split("?", 1)[0].strip("/") != WEBHOOK_PATH:
+                status = 404
+            elif not hmac.compare_digest(secret, WEBHOOK_SECRET):
+                status = 403
+            elif busy or done.done():
+                # Ikkinchi so'rov — Telegram uni keyingi jarayonga qayta yuboradi
+                status = 503
+            else:
+                busy = True
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    status = 400
+                    busy = False
+                else:
+                    bot = await bot_module
+                    try:
+                        await bot.process_one_update(data)
+                        status = 200
+                    except Exception:
+                        log.exception("Update qayta ishlanmadi")
+                    result = 0 if status == 200 else 1
+        except Exception:
+            status = 400
+        try:
+            writer.write(
+                f"HTTP/1.1 {status} {STATUS[status]}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+        # Javob yozib bo'lingach jarayon chiqishi mumkin
+        if result is not None and not done.done():
+            done.set_result(result)
+
+    server = await asyncio.start_server(handle, WEBHOOK_LISTEN, PORT)
+    try:
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(done), IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                if busy:
+                    continue
+                log.info("%ss ichida webhook so'rovi kelmadi — chiqilmoqda", IDLE_SECONDS)
+                return 0
+    finally:
+        server.close()
+        await bot_module
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    if not WEBHOOK_SECRET:
+        log.error("WEBHOOK_SECRET yo'q — secret'siz webhook so'rovlari qabul qilinmaydi")
+        return 2
+    return asyncio.run(serve_once())
+
+if __name__ == "__main__":
+    sys.exit(main())